@@ -0,0 +1,81 @@
+import math
+from typing import Any, Dict, Optional
+
+# A value is anomalous when it sits this many standard deviations above the mean...
+Z_THRESHOLD = 3.0
+# ...is also well above the mean in absolute terms...
+MIN_RATIO = 1.5
+# ...and there is enough history to judge it against
+MIN_MONTHS = 3
+MIN_TRANSACTIONS = 5
+# Floor on the deviation so very regular spending doesn't flag tiny changes
+MIN_STDDEV_RATIO = 0.1
+
+
+class RunningStats:
+    # Welford running mean/variance that also supports removing a value and
+    # merging a batch (Chan et al.), so stored stats never need a rescan.
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x: float) -> None:
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        mean = (self.n * self.mean - x) / (self.n - 1)
+        self.m2 = max(0.0, self.m2 - (x - mean) * (x - self.mean))
+        self.mean = mean
+        self.n -= 1
+
+    def merge(self, other: "RunningStats") -> None:
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    def without(self, x: float) -> "RunningStats":
+        copy = RunningStats(self.n, self.mean, self.m2)
+        copy.remove(x)
+        return copy
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+def anomaly_score(stats: RunningStats, value: float, min_samples: int) -> Optional[float]:
+    # z-score of value against stats, or None when it isn't a sharp upward deviation
+    if stats.n < min_samples or stats.mean <= 0:
+        return None
+    stddev = max(stats.stddev, stats.mean * MIN_STDDEV_RATIO)
+    z = (value - stats.mean) / stddev
+    if z < Z_THRESHOLD or value < stats.mean * MIN_RATIO:
+        return None
+    return z
+
+
+def describe_alert(alert: Dict[str, Any]) -> str:
+    name = alert.get("name") or alert.get("key")
+    ratio = alert["amount"] / alert["expected"] if alert["expected"] else 0
+    if alert["kind"] == "transaction":
+        return (
+            f"{alert.get('description') or name} for ${alert['amount']:.2f} is {ratio:.1f}x "
+            f"your typical {name} charge of ${alert['expected']:.2f}."
+        )
+    return (
+        f"{name} spending in {alert['month']} is ${alert['amount']:.2f}, "
+        f"{ratio:.1f}x your usual ${alert['expected']:.2f} a month."
+    )
@@ -2,6 +2,8 @@ import pandas as pd
 import re
 from typing import List, Dict, Any, Tuple
 from collections import defaultdict
+from analysis.recurring_charges import RecurringChargeDetector
+from models import Transaction
 
 class ExpenseAnalyzer:
     def __init__(self, custom_categories=None):
@@ -25,8 +27,8 @@ class ExpenseAnalyzer:
             }
             self.categories = {**custom_map, **self.categories}
     
-    def analyze_expenses(self, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
-        categorized_transactions = self._categorize_transactions(transactions)
+    def analyze_expenses(self, transactions: List[Transaction]) -> Dict[str, Any]:
+        categorized_transactions = self.categorize_transactions(transactions)
         
         analysis = {
             'total_expenses': self._calculate_total_expenses(categorized_transactions),
@@ -39,18 +41,25 @@ class ExpenseAnalyzer:
         
         return analysis
     
-    def _categorize_transactions(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def categorize_transactions(self, transactions: List[Transaction]) -> List[Transaction]:
+        # Keyword matching is per distinct description, not per row
+        cache = {}
         for transaction in transactions:
-            if transaction.get('category'):
+            if transaction.category:
                 continue
-            if transaction['amount'] >= 0:
-                transaction['category'] = 'income'
+            if transaction.amount >= 0:
+                transaction.category = 'income'
             else:
-                description = transaction['description'].lower()
-                transaction['category'] = self._categorize_description(description)
+                category = cache.get(transaction.description)
+                if category is None:
+                    category = cache[transaction.description] = self._categorize_description(transaction.description.lower())
+                transaction.category = category
         
         return transactions
     
+    def categorize(self, description: str) -> str:
+        return self._categorize_description(description.lower())
+    
     def _categorize_description(self, description: str) -> str:
         description = description.replace('&', ' ')
         for category, keywords in self.categories.items():
@@ -59,53 +68,38 @@ class ExpenseAnalyzer:
                     return category
         return 'other'
     
-    def _calculate_total_expenses(self, transactions: List[Dict[str, Any]]) -> float:
-        return sum(abs(t['amount']) for t in transactions if t['amount'] < 0)
+    def _calculate_total_expenses(self, transactions: List[Transaction]) -> float:
+        return sum(abs(t.amount) for t in transactions if t.amount < 0)
     
-    def _get_category_breakdown(self, transactions: List[Dict[str, Any]]) -> Dict[str, float]:
+    def _get_category_breakdown(self, transactions: List[Transaction]) -> Dict[str, float]:
         category_totals = defaultdict(float)
         
         for transaction in transactions:
-            if transaction['amount'] < 0:
-                category_totals[transaction['category']] += abs(transaction['amount'])
+            if transaction.amount < 0:
+                category_totals[transaction.category] += abs(transaction.amount)
         
         return dict(category_totals)
     
-    def _calculate_monthly_trends(self, transactions: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    def _calculate_monthly_trends(self, transactions: List[Transaction]) -> Dict[str, Dict[str, float]]:
         monthly_data = defaultdict(lambda: defaultdict(float))
         
         for transaction in transactions:
-            if transaction['amount'] < 0:
-                month = transaction['date'][:7]  # YYYY-MM
-                category = transaction['category']
-                monthly_data[month][category] += abs(transaction['amount'])
+            if transaction.amount < 0:
+                month = transaction.date[:7]  # YYYY-MM
+                category = transaction.category
+                monthly_data[month][category] += abs(transaction.amount)
         
         return dict(monthly_data)
     
-    def _get_top_expenses(self, transactions: List[Dict[str, Any]], limit: int = 10) -> List[Dict[str, Any]]:
-        expenses = [t for t in transactions if t['amount'] < 0]
-        return sorted(expenses, key=lambda x: abs(x['amount']), reverse=True)[:limit]
+    def _get_top_expenses(self, transactions: List[Transaction], limit: int = 10) -> List[Dict[str, Any]]:
+        expenses = [t for t in transactions if t.amount < 0]
+        top = sorted(expenses, key=lambda x: abs(x.amount), reverse=True)[:limit]
+        return [t.to_dict() for t in top]
     
-    def _analyze_subscriptions(self, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
-        recurring = defaultdict(list)
-        
-        for transaction in transactions:
-            if transaction['amount'] < 0 and 'subscription' in transaction['description'].lower():
-                recurring[transaction['description']].append(abs(transaction['amount']))
-        
-        subscription_analysis = {}
-        for description, amounts in recurring.items():
-            avg_amount = sum(amounts) / len(amounts)
-            monthly_cost = avg_amount * 12
-            subscription_analysis[description] = {
-                'average_amount': avg_amount,
-                'annual_cost': monthly_cost,
-                'frequency': len(amounts)
-            }
-        
-        return subscription_analysis
+    def _analyze_subscriptions(self, transactions: List[Transaction]) -> Dict[str, Any]:
+        return RecurringChargeDetector().detect(transactions)
     
-    def _generate_recommendations(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _generate_recommendations(self, transactions: List[Transaction]) -> List[Dict[str, Any]]:
         recommendations = []
         category_breakdown = self._get_category_breakdown(transactions)
         total_expenses = self._calculate_total_expenses(transactions)
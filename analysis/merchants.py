@@ -0,0 +1,28 @@
+import re
+from functools import lru_cache
+
+_PREFIXES = re.compile(
+    r'^(?:pos |debit card purchase |card purchase |purchase |checkcard |recurring |ach |'
+    r'sq \*|sq\*|tst\* |tst\*|paypal \*|pp\*|dd \*|sp \*)+'
+)
+_DOMAIN = re.compile(r'\.(?:com|net|org|co|io)\b')
+_NON_ALPHA = re.compile(r'[^a-z& ]+')
+_SPACES = re.compile(r'\s+')
+
+MAX_MERCHANT_TOKENS = 3
+
+
+# "NETFLIX.COM 866-579-7172 CA" and "Netflix.com 1234 CA" both map to "netflix".
+# Cached because the same raw descriptions repeat across a long history.
+@lru_cache(maxsize=65536)
+def normalize_merchant(description: str) -> str:
+    text = (description or "").lower().strip()
+    text = _PREFIXES.sub('', text)
+    text = _DOMAIN.sub(' ', text)
+    text = _NON_ALPHA.sub(' ', text)
+    tokens = _SPACES.sub(' ', text).strip().split(' ')
+    # Drop trailing state codes and other short location suffixes
+    while len(tokens) > 1 and len(tokens[-1]) <= 2:
+        tokens.pop()
+    merchant = ' '.join(tokens[:MAX_MERCHANT_TOKENS]).strip()
+    return merchant or (description or "").strip().lower() or "unknown"
@@ -0,0 +1,133 @@
+from collections import Counter, defaultdict
+from datetime import date
+from statistics import median, pstdev
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from analysis.merchants import normalize_merchant
+from models import Transaction
+
+# name, nominal interval in days, allowed deviation in days, charges per year
+PERIODS = [
+    ('weekly', 7.0, 2.0, 52.0),
+    ('biweekly', 14.0, 3.0, 26.0),
+    ('monthly', 30.44, 5.0, 12.0),
+    ('quarterly', 91.31, 10.0, 4.0),
+    ('annual', 365.25, 20.0, 1.0),
+]
+
+
+class RecurringChargeDetector:
+    def __init__(self, min_occurrences: int = 3, min_annual_occurrences: int = 2,
+                 min_regularity: float = 0.6, max_amount_variation: float = 0.25):
+        self.min_occurrences = min_occurrences
+        self.min_annual_occurrences = min_annual_occurrences
+        self.min_regularity = min_regularity
+        self.max_amount_variation = max_amount_variation
+
+    def detect(self, transactions: Iterable[Transaction], as_of: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        groups, names, latest = self._group_by_merchant(transactions)
+        reference = self._to_ordinal(as_of) or latest
+
+        recurring = {}
+        for key, charges in groups.items():
+            result = self._analyze_group(charges, reference)
+            if result is None:
+                continue
+            description = names[key].most_common(1)[0][0]
+            merchant = normalize_merchant(description)
+            result['merchant'] = merchant
+            result['merchant_id'] = key if isinstance(key, int) else None
+            result['description'] = description
+            recurring[merchant] = result
+        return recurring
+
+    def _group_by_merchant(self, transactions: Iterable[Transaction]) -> Tuple[Dict[Any, List[Tuple[int, float]]], Dict[Any, Counter], int]:
+        groups = defaultdict(list)
+        names = defaultdict(Counter)
+        latest = 0
+        ordinals = {}
+        for t in transactions:
+            if t.amount is None or t.amount >= 0 or not t.description:
+                continue
+            # Dates repeat heavily across rows, so parse each distinct one once
+            day = ordinals.get(t.date, -1)
+            if day == -1:
+                day = ordinals[t.date] = self._to_ordinal(t.date)
+            if day is None:
+                continue
+            # Stored rows carry a merchant id; ad-hoc rows fall back to normalizing text
+            key = t.merchant_id if t.merchant_id is not None else normalize_merchant(t.description)
+            groups[key].append((day, abs(t.amount)))
+            names[key][t.description] += 1
+            if day > latest:
+                latest = day
+        return groups, names, latest
+
+    def _analyze_group(self, charges: List[Tuple[int, float]], reference: int) -> Optional[Dict[str, Any]]:
+        if len(charges) < self.min_annual_occurrences:
+            return None
+        charges.sort()
+        days = [d for d, _ in charges]
+        amounts = [a for _, a in charges]
+        gaps = [b - a for a, b in zip(days, days[1:]) if b > a]
+        if not gaps:
+            return None
+
+        period = self._match_period(median(gaps))
+        if period is None:
+            return None
+        name, interval, tolerance, per_year = period
+        min_count = self.min_annual_occurrences if name == 'annual' else self.min_occurrences
+        if len(charges) < min_count:
+            return None
+
+        # Gaps that span several periods are missed charges, not a broken cadence
+        on_schedule = 0
+        missed = 0
+        for gap in gaps:
+            cycles = max(1, round(gap / interval))
+            if abs(gap - cycles * interval) <= tolerance * cycles:
+                on_schedule += 1
+                missed += cycles - 1
+        regularity = on_schedule / len(gaps)
+        if regularity < self.min_regularity:
+            return None
+
+        typical_amount = median(amounts)
+        variation = pstdev(amounts) / typical_amount if typical_amount > 0 else 0.0
+        if variation > self.max_amount_variation:
+            return None
+
+        last_day = days[-1]
+        next_expected = last_day + round(interval)
+        overdue = reference - next_expected > tolerance
+
+        return {
+            'period': name,
+            'interval_days': round(median(gaps), 1),
+            'average_amount': sum(amounts) / len(amounts),
+            'typical_amount': typical_amount,
+            'amount_variation': round(variation, 4),
+            'regularity': round(regularity, 4),
+            'annual_cost': typical_amount * per_year,
+            'frequency': len(charges),
+            'first_charge': date.fromordinal(days[0]).isoformat(),
+            'last_charge': date.fromordinal(last_day).isoformat(),
+            'next_expected': date.fromordinal(next_expected).isoformat(),
+            'missed_charges': missed,
+            'possibly_cancelled': overdue,
+        }
+
+    def _match_period(self, gap: float) -> Optional[Tuple[str, float, float, float]]:
+        for period in PERIODS:
+            if abs(gap - period[1]) <= period[2]:
+                return period
+        return None
+
+    def _to_ordinal(self, value: Optional[str]) -> Optional[int]:
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value[:10]).toordinal()
+        except ValueError:
+            return None
@@ -1,18 +1,28 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, abort
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, abort, stream_with_context
 import os
-from werkzeug.utils import secure_filename
+import sqlite3
 from parsers.statement_parser import StatementParser
+from analysis.anomalies import describe_alert
 from analysis.expense_analyzer import ExpenseAnalyzer
-from db import init_db, migrate_json_if_present, list_transactions, add_transactions, clear_transactions, delete_transaction, get_conn, list_category_rules, add_category_rule, delete_category_rule
-import uuid
+from models import Transaction, to_dicts
+import exporters
+from compression import init_compression
+from json_provider import FastJSONProvider
+from uploads import UploadBatch, UploadLimitError
+from db import init_db, migrate_json_if_present, list_transactions, add_transactions, clear_transactions, delete_transaction, update_transaction_fields, list_merchant_totals, search_transactions, iter_transactions, list_category_rules, add_category_rule, update_category_rule, delete_category_rule, bulk_update_category, apply_category_rule, refresh_spending_stats, list_spending_alerts, dismiss_spending_alert
+import threading
 import time
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-init_db()
-migrate_json_if_present()
+app.config['MAX_CONTENT_LENGTH'] = 512 * 1024 * 1024  # 512MB per upload request, as sent
+app.config['UPLOAD_MAX_EXPANDED_SIZE'] = 2 * 1024 * 1024 * 1024  # 2GB of statements per upload once archives are expanded
+app.config['UPLOAD_MAX_ENTRIES'] = 1000  # files per upload, counting archive members
+app.config['COMPRESS_MIN_SIZE'] = 1024  # only compress responses above 1KB
+init_compression(app)
+_initialized = False
+_init_lock = threading.Lock()
 
 
 def cleanup_old_uploads(days: int = 30) -> int:
@@ -31,19 +41,92 @@ def cleanup_old_uploads(days: int = 30) -> int:
     return removed
 
 
-cleanup_old_uploads()
+def init_app() -> None:
+    # Database setup and upload housekeeping, run once per server process.
+    # Kept out of module import because spawned PDF workers re-import the main
+    # module (app.py or wsgi.py) and must not repeat any of it.
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        init_db()
+        migrate_json_if_present()
+        refresh_spending_stats(ExpenseAnalyzer(custom_categories=list_category_rules()).categorize)
+        cleanup_old_uploads()
+        _initialized = True
+
+
+@app.errorhandler(sqlite3.OperationalError)
+def _database_error(error):
+    # Lock timeouts are transient, so report them as a retryable 503; either way
+    # the message is returned instead of the generic error page
+    status = 503 if 'locked' in str(error) else 500
+    return jsonify({'error': str(error)}), status
+
+
+@app.before_request
+def _ensure_initialized():
+    # Covers hosts that import app without going through an entry point (flask run, test clients)
+    if not _initialized:
+        init_app()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-def _save_upload(file) -> str:
-    file_id = uuid.uuid4().hex
-    filename = secure_filename(file.filename)
-    stored_name = f"{file_id}_{filename}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
-    file.save(filepath)
-    return filepath
+def _new_upload_batch() -> UploadBatch:
+    return UploadBatch(
+        app.config['UPLOAD_FOLDER'],
+        app.config['UPLOAD_MAX_EXPANDED_SIZE'],
+        app.config['UPLOAD_MAX_ENTRIES'],
+    )
+
+
+def _save_upload(batch: UploadBatch, stream, filename: str):
+    # Files are written in chunks and hashed as they arrive; .zip/.gz/.tar.gz
+    # bundles are expanded straight into their statement files
+    try:
+        batch.add(stream, filename)
+    except UploadLimitError as e:
+        batch.discard()
+        return jsonify({'error': str(e)}), 413
+    except Exception:
+        # e.g. the disk filled up; don't leave the files saved so far behind
+        batch.discard()
+        raise
+    return None
+
+
+def _upload_preview_response(batch: UploadBatch):
+    parser = StatementParser()
+    preview = None
+    errors = list(batch.errors)
+
+    for saved in batch.files:
+        if preview is not None:
+            break
+        filepath = saved['path']
+        if filepath.lower().endswith(('.csv', '.xlsx', '.xls')):
+            try:
+                preview = parser.preview_spreadsheet(filepath)
+            except Exception as e:
+                errors.append(f"{saved['name']}: {e}")
+        elif filepath.lower().endswith('.pdf'):
+            try:
+                preview = parser.preview_pdf(filepath)
+            except Exception as e:
+                errors.append(f"{saved['name']}: {e}")
+        else:
+            errors.append(f"{saved['name']}: unsupported file format (CSV/Excel/PDF only)")
+
+    return jsonify({
+        "success": True,
+        "file_ids": batch.file_ids,
+        "files": batch.summaries(),
+        "preview": preview,
+        "errors": errors
+    })
 
 
 @app.route('/upload/preview', methods=['POST'])
@@ -56,29 +139,27 @@ def upload_preview():
     if not files:
         return jsonify({'error': 'No file selected'}), 400
 
-    parser = StatementParser()
-    file_ids = []
-    preview = None
-    errors = []
+    batch = _new_upload_batch()
+    for file in files:
+        error = _save_upload(batch, file.stream, file.filename)
+        if error:
+            return error
+    return _upload_preview_response(batch)
 
-    for idx, file in enumerate(files):
-        filepath = _save_upload(file)
-        file_ids.append(os.path.basename(filepath))
-        if preview is None:
-            if filepath.lower().endswith(('.csv', '.xlsx', '.xls')):
-                try:
-                    preview = parser.preview_spreadsheet(filepath)
-                except Exception as e:
-                    errors.append(f"{file.filename}: {e}")
-            else:
-                errors.append(f"{file.filename}: unsupported file format (CSV/Excel only)")
 
-    return jsonify({
-        "success": True,
-        "file_ids": file_ids,
-        "preview": preview,
-        "errors": errors
-    })
+@app.route('/upload/stream', methods=['POST', 'PUT'])
+def upload_stream():
+    # Raw request body instead of multipart, read straight off the socket:
+    # curl -T statements.zip "http://localhost:5000/upload/stream?filename=statements.zip"
+    filename = request.args.get('filename') or request.headers.get('X-Filename')
+    if not filename:
+        return jsonify({'error': 'filename is required'}), 400
+
+    batch = _new_upload_batch()
+    error = _save_upload(batch, request.stream, filename)
+    if error:
+        return error
+    return _upload_preview_response(batch)
 
 
 @app.route('/upload/preview-file', methods=['GET'])
@@ -99,7 +180,13 @@ def preview_file():
             return jsonify({'success': True, 'type': 'table', **preview})
         except Exception as e:
             return jsonify({'error': str(e)}), 400
-    return jsonify({'error': 'Unsupported file format (CSV/Excel only)'}), 400
+    if filepath.lower().endswith('.pdf'):
+        try:
+            preview = parser.preview_pdf(filepath)
+            return jsonify({'success': True, 'type': 'table', **preview})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify({'error': 'Unsupported file format (CSV/Excel/PDF only)'}), 400
 
 
 @app.route('/upload/view/<path:file_id>', methods=['GET'])
@@ -150,6 +237,10 @@ def view_uploaded_file(file_id):
 </html>
 """
 
+    if filepath.lower().endswith('.pdf'):
+        # Browsers render PDFs natively
+        return send_from_directory(app.config['UPLOAD_FOLDER'], file_id, as_attachment=False)
+
     return abort(400)
 
 
@@ -185,18 +276,19 @@ def upload_commit():
     if not all_transactions and errors:
         return jsonify({'error': " | ".join(errors)}), 400
 
-    _, added, skipped = add_transactions(all_transactions, source="upload", bank=bank_name)
-    transactions = list_transactions()
     analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
+    _, added, skipped, alert_ids = add_transactions(all_transactions, source="upload", bank=bank_name, categorize=analyzer.categorize)
+    transactions = list_transactions()
     analysis = analyzer.analyze_expenses(transactions)
 
     return jsonify({
         'success': True,
-        'transactions': transactions,
+        'transactions': to_dicts(transactions),
         'analysis': analysis,
         'imported': len(all_transactions),
         'added': added,
         'skipped': skipped,
+        'alerts': _alerts(ids=alert_ids),
         'errors': errors
     })
 
@@ -264,7 +356,7 @@ def get_uploaded_file(file_id):
 @app.route('/analyze', methods=['POST'])
 def analyze():
     data = request.json
-    transactions = data.get('transactions', [])
+    transactions = [Transaction.from_dict(t) for t in data.get('transactions', [])]
     
     analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
     analysis = analyzer.analyze_expenses(transactions)
@@ -276,7 +368,78 @@ def get_transactions():
     transactions = list_transactions()
     analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
     analysis = analyzer.analyze_expenses(transactions)
-    return jsonify({'transactions': transactions, 'analysis': analysis})
+    return jsonify({'transactions': to_dicts(transactions), 'analysis': analysis})
+
+@app.route('/transactions/search', methods=['GET'])
+def search():
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    try:
+        transactions, has_more = search_transactions(
+            query,
+            start_date=request.args.get('start_date') or None,
+            end_date=request.args.get('end_date') or None,
+            category=request.args.get('category') or None,
+            limit=limit,
+            offset=offset,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
+    analyzer.categorize_transactions(transactions)
+    return jsonify({
+        'transactions': to_dicts(transactions),
+        'limit': limit,
+        'offset': offset,
+        'has_more': has_more
+    })
+
+def _export_batches():
+    analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
+    batches = iter_transactions(
+        start_date=request.args.get('start_date') or None,
+        end_date=request.args.get('end_date') or None,
+    )
+    return exporters.filter_batches(
+        batches,
+        analyzer.categorize_transactions,
+        category=request.args.get('category') or None,
+    )
+
+
+@app.route('/transactions/export', methods=['GET'])
+def export_transactions():
+    fmt = (request.args.get('format') or 'csv').lower()
+    if fmt not in exporters.EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(exporters.EXPORT_FORMATS)}"}), 400
+    if fmt != 'csv' and not exporters.arrow_available():
+        return jsonify({'error': f"{fmt} export requires pyarrow"}), 400
+
+    writers = {
+        'csv': exporters.iter_csv,
+        'parquet': exporters.iter_parquet,
+        'arrow': exporters.iter_arrow,
+    }
+    mimetype, extension = exporters.EXPORT_FORMATS[fmt]
+    body = writers[fmt](_export_batches())
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=transactions.{extension}'}
+    )
+
+
+@app.route('/analysis/export', methods=['GET'])
+def export_analysis():
+    body = exporters.iter_analysis_csv(_export_batches())
+    return Response(
+        stream_with_context(body),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=analysis.csv'}
+    )
 
 @app.route('/transactions', methods=['POST'])
 def add_transaction():
@@ -295,18 +458,13 @@ def add_transaction():
     except ValueError:
         return jsonify({'error': 'amount must be a number'}), 400
 
-    transaction = {
-        'date': date,
-        'description': description,
-        'amount': amount,
-        'category': category
-    }
+    transaction = Transaction(date, description, amount, category)
 
-    add_transactions([transaction], source="manual", bank=bank_name)
-    transactions = list_transactions()
     analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
+    add_transactions([transaction], source="manual", bank=bank_name, categorize=analyzer.categorize)
+    transactions = list_transactions()
     analysis = analyzer.analyze_expenses(transactions)
-    return jsonify({'success': True, 'transactions': transactions, 'analysis': analysis})
+    return jsonify({'success': True, 'transactions': to_dicts(transactions), 'analysis': analysis})
 
 
 @app.route('/transactions/<int:txn_id>', methods=['DELETE'])
@@ -315,7 +473,7 @@ def remove_transaction(txn_id: int):
     transactions = list_transactions()
     analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
     analysis = analyzer.analyze_expenses(transactions)
-    return jsonify({'success': removed, 'transactions': transactions, 'analysis': analysis})
+    return jsonify({'success': removed, 'transactions': to_dicts(transactions), 'analysis': analysis})
 
 
 @app.route('/transactions/<int:txn_id>', methods=['PATCH'])
@@ -326,42 +484,64 @@ def update_transaction(txn_id: int):
     amount = data.get('amount')
     date = data.get('date')
 
-    fields = []
-    values = []
+    changes = {}
     if category is not None:
-        fields.append("category = ?")
-        values.append(category if category != "" else None)
+        changes['category'] = category if category != "" else None
     if description is not None:
-        fields.append("description = ?")
-        values.append(description.strip())
+        changes['description'] = description.strip()
     if amount is not None:
         try:
-            amount = float(amount)
-            fields.append("amount = ?")
-            values.append(amount)
+            changes['amount'] = float(amount)
         except ValueError:
             return jsonify({'error': 'amount must be a number'}), 400
     if date is not None:
-        fields.append("date = ?")
-        values.append(date)
+        changes['date'] = date
 
-    if not fields:
+    if not changes:
         return jsonify({'error': 'No fields to update'}), 400
 
-    values.append(txn_id)
-    with get_conn() as conn:
-        cur = conn.execute(
-            f"UPDATE transactions SET {', '.join(fields)} WHERE id = ?",
-            values
-        )
-        conn.commit()
-        if cur.rowcount == 0:
-            return jsonify({'error': 'Transaction not found'}), 404
+    analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
+    if not update_transaction_fields(txn_id, changes, categorize=analyzer.categorize):
+        return jsonify({'error': 'Transaction not found'}), 404
+
+    transactions = list_transactions()
+    analysis = analyzer.analyze_expenses(transactions)
+    return jsonify({'success': True, 'transactions': to_dicts(transactions), 'analysis': analysis})
+
+
+@app.route('/transactions/bulk-category', methods=['POST'])
+def bulk_update_transactions_category():
+    data = request.json or {}
+    if not isinstance(data, dict) or 'category' not in data:
+        return jsonify({'error': 'category is required'}), 400
+    category = data.get('category')
+    if category is not None and not isinstance(category, str):
+        return jsonify({'error': 'category must be a string or null'}), 400
+    ids = data.get('ids') or []
+    # bool is an int subclass, but true/false are never transaction ids
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    filters = data.get('filter') or {}
+    if not isinstance(filters, dict) or not all(isinstance(v, str) for v in filters.values()):
+        return jsonify({'error': 'filter must be an object of strings'}), 400
+    if not ids and not filters:
+        return jsonify({'error': 'ids or filter is required'}), 400
+
+    analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
+    try:
+        updated = bulk_update_category(category, ids=ids, filters=filters, categorize=analyzer.categorize)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
 
     transactions = list_transactions()
-    analyzer = ExpenseAnalyzer()
     analysis = analyzer.analyze_expenses(transactions)
-    return jsonify({'success': True, 'transactions': transactions, 'analysis': analysis})
+    return jsonify({'success': True, 'updated': updated, 'transactions': to_dicts(transactions), 'analysis': analysis})
+
+
+@app.route('/merchants', methods=['GET'])
+def get_merchants():
+    limit = request.args.get('limit', type=int)
+    return jsonify({'merchants': list_merchant_totals(limit=limit)})
 
 
 @app.route('/categories', methods=['GET'])
@@ -369,27 +549,109 @@ def get_categories():
     return jsonify({'categories': list_category_rules()})
 
 
+def _parse_keywords(data) -> list:
+    keywords = data.get('keywords') or []
+    if isinstance(keywords, str):
+        keywords = [k.strip() for k in keywords.split(',')]
+    return keywords
+
+
+def _refresh_rule_stats(keywords: list) -> None:
+    # Only uncategorized rows matching the rule's old or new keywords can change
+    # automatic category
+    refresh_spending_stats(ExpenseAnalyzer(custom_categories=list_category_rules()).categorize, keywords=keywords)
+
+
+def _apply_rule_response(rule_id: int, overwrite: bool, **extra):
+    analyzer = ExpenseAnalyzer(custom_categories=list_category_rules())
+    updated = apply_category_rule(rule_id, overwrite=overwrite, categorize=analyzer.categorize)
+    transactions = list_transactions()
+    analysis = analyzer.analyze_expenses(transactions)
+    return jsonify({
+        'success': True,
+        'updated': updated,
+        'categories': list_category_rules(),
+        'transactions': to_dicts(transactions),
+        'analysis': analysis,
+        **extra
+    })
+
+
 @app.route('/categories', methods=['POST'])
 def create_category():
     data = request.json or {}
     name = (data.get('name') or '').strip()
-    keywords = data.get('keywords') or []
-    if isinstance(keywords, str):
-        keywords = [k.strip() for k in keywords.split(',')]
+    keywords = _parse_keywords(data)
     if not name or not keywords:
         return jsonify({'error': 'name and keywords are required'}), 400
     try:
         rule = add_category_rule(name, keywords)
     except Exception:
         return jsonify({'error': 'category already exists'}), 400
+    _refresh_rule_stats(keywords)
+    if data.get('apply', True):
+        return _apply_rule_response(rule['id'], bool(data.get('overwrite')), category=rule)
     return jsonify({'success': True, 'category': rule, 'categories': list_category_rules()})
 
 
+@app.route('/categories/<int:rule_id>', methods=['PATCH'])
+def edit_category(rule_id: int):
+    data = request.json or {}
+    keywords = _parse_keywords(data)
+    if not keywords:
+        return jsonify({'error': 'keywords are required'}), 400
+    old = next((rule for rule in list_category_rules() if rule['id'] == rule_id), None)
+    if old is None or not update_category_rule(rule_id, keywords):
+        return jsonify({'error': 'Category not found'}), 404
+    _refresh_rule_stats(old['keywords'].split(',') + keywords)
+    if data.get('apply', True):
+        return _apply_rule_response(rule_id, bool(data.get('overwrite')))
+    return jsonify({'success': True, 'categories': list_category_rules()})
+
+
+@app.route('/categories/<int:rule_id>/apply', methods=['POST'])
+def apply_category(rule_id: int):
+    data = request.get_json(silent=True) or {}
+    try:
+        return _apply_rule_response(rule_id, bool(data.get('overwrite')))
+    except KeyError:
+        return jsonify({'error': 'Category not found'}), 404
+
+
 @app.route('/categories/<int:rule_id>', methods=['DELETE'])
 def remove_category(rule_id: int):
-    deleted = delete_category_rule(rule_id)
+    rules = list_category_rules()
+    removed = next((rule for rule in rules if rule['id'] == rule_id), None)
+    # Rows released by the rule are categorized as if it were already gone
+    analyzer = ExpenseAnalyzer(custom_categories=[rule for rule in rules if rule['id'] != rule_id])
+    deleted = delete_category_rule(rule_id, categorize=analyzer.categorize)
+    if deleted and removed:
+        # Only rows counted under the rule's name can lose it as their automatic category
+        refresh_spending_stats(analyzer.categorize, category=removed['name'])
     return jsonify({'success': deleted, 'categories': list_category_rules()})
 
+
+def _alerts(**filters) -> list:
+    alerts = list_spending_alerts(**filters)
+    for alert in alerts:
+        alert['message'] = describe_alert(alert)
+    return alerts
+
+
+@app.route('/alerts', methods=['GET'])
+def get_alerts():
+    include_dismissed = request.args.get('include_dismissed', '').lower() in ('1', 'true', 'yes')
+    limit = request.args.get('limit', type=int)
+    return jsonify({'alerts': _alerts(since=request.args.get('since'), include_dismissed=include_dismissed, limit=limit)})
+
+
+@app.route('/alerts/<int:alert_id>/dismiss', methods=['POST'])
+def dismiss_alert(alert_id: int):
+    if not dismiss_spending_alert(alert_id):
+        return jsonify({'error': 'Alert not found'}), 404
+    return jsonify({'success': True})
+
+
 @app.route('/transactions/clear', methods=['POST'])
 def clear_all_transactions():
     clear_transactions()
@@ -404,4 +666,5 @@ def clear_all_transactions():
     return jsonify({'success': True})
 
 if __name__ == '__main__':
+    init_app()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,98 @@
+"""Serialize-plus-transfer benchmark for the GET /transactions payload.
+
+Builds a synthetic history, runs it through ExpenseAnalyzer, then times each
+JSON encoder and content encoding and adds a modeled transfer time for the
+given link speed:
+
+    python benchmarks/bench_json_payload.py --rows 10000 100000 1000000 --bandwidth-mbps 100
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis.expense_analyzer import ExpenseAnalyzer  # noqa: E402
+from compression import available_encodings, compress  # noqa: E402
+from models import Transaction, to_dicts  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MERCHANTS = [
+    "AMAZON MKTP US", "WHOLE FOODS MARKET", "NETFLIX.COM", "SHELL OIL", "UBER TRIP",
+    "STARBUCKS STORE", "TARGET", "WALMART SUPERCENTER", "CITY WATER UTILITY", "CVS PHARMACY",
+]
+
+
+def build_transactions(rows: int, seed: int = 7):
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    return [
+        Transaction(
+            (start + timedelta(days=rng.randrange(3650))).isoformat(),
+            f"{rng.choice(MERCHANTS)} #{rng.randrange(1000)}",
+            -round(rng.uniform(1, 250), 2),
+            id=i + 1,
+        )
+        for i in range(rows)
+    ]
+
+
+def encoders():
+    found = {"stdlib": lambda obj: json.dumps(obj, separators=(",", ":")).encode("utf-8")}
+    if orjson is not None:
+        found["orjson"] = lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return found
+
+
+def best_of(repeat: int, fn):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(rows: int, bandwidth_mbps: float, repeat: int, level: int) -> None:
+    transactions = build_transactions(rows)
+    analysis = ExpenseAnalyzer().analyze_expenses(transactions)
+    payload = {"transactions": to_dicts(transactions), "analysis": analysis}
+    bytes_per_second = bandwidth_mbps * 1_000_000 / 8
+
+    print(f"\n{rows:,} rows @ {bandwidth_mbps:g} Mbit/s")
+    print(f"{'encoder':<8} {'encoding':<9} {'size MB':>9} {'encode s':>9} {'compress s':>11} {'transfer s':>11} {'total s':>9}")
+    for name, encode in encoders().items():
+        encode_time, body = best_of(repeat, lambda: encode(payload))
+        for encoding in ["identity"] + available_encodings():
+            if encoding == "identity":
+                compress_time, data = 0.0, body
+            else:
+                compress_time, data = best_of(repeat, lambda: compress(body, encoding, level))
+            transfer = len(data) / bytes_per_second
+            total = encode_time + compress_time + transfer
+            print(f"{name:<8} {encoding:<9} {len(data) / 1e6:>9.2f} {encode_time:>9.3f} {compress_time:>11.3f} {transfer:>11.3f} {total:>9.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--level", type=int, default=5, help="gzip/brotli compression level")
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.bandwidth_mbps, args.repeat, args.level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Concurrent mixed-workload load test for the budget app.
+
+Simulates several browser tabs at once: statement imports, GET /transactions,
+row edits, search and category management. Runs fully offline, either
+in-process against the Flask app (with a throwaway data directory) or against
+a server already listening on localhost:
+
+    python benchmarks/load_test.py --workers 8 --duration 30
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --mix import=1,list=4,edit=3,search=2,categories=1
+
+Reports throughput, p50/p95/p99 latency and error counts per endpoint, plus
+how many failures were SQLite "database is locked" errors.
+"""
+import argparse
+import http.client
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+MERCHANTS = [
+    "AMAZON MKTP US", "WHOLE FOODS MARKET", "NETFLIX.COM", "SHELL OIL", "UBER TRIP",
+    "STARBUCKS STORE", "TARGET", "WALMART SUPERCENTER", "CITY WATER UTILITY", "CVS PHARMACY",
+]
+SEARCH_TERMS = ["amaz*", "\"whole foods\"", "netflix", "uber", "star*", "walmart", "cvs"]
+DEFAULT_MIX = "import=1,list=5,edit=3,search=2,categories=1"
+LOCK_MESSAGES = ("database is locked", "database table is locked")
+
+
+def generate_statement(rows: int, rng: random.Random) -> bytes:
+    start = date.today() - timedelta(days=3 * 365)
+    lines = ["Date,Description,Amount"]
+    for _ in range(rows):
+        day = start + timedelta(days=rng.randrange(3 * 365))
+        merchant = rng.choice(MERCHANTS)
+        # A random reference keeps most rows out of the importer's dedup check
+        lines.append(f"{day:%m/%d/%Y},{merchant} #{rng.randrange(100000)},-{rng.uniform(1, 250):.2f}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class InProcessClient:
+    def __init__(self, flask_app, tracker: "ExceptionTracker"):
+        self.client = flask_app.test_client()
+        self.tracker = tracker
+
+    def request(self, method: str, path: str, body: Any = None, files: Optional[Dict[str, Tuple[str, bytes]]] = None) -> Tuple[int, Any, Optional[str]]:
+        self.tracker.reset()
+        kwargs: Dict[str, Any] = {}
+        if files:
+            kwargs["data"] = {k: (io.BytesIO(v[1]), v[0]) for k, v in files.items()}
+            kwargs["content_type"] = "multipart/form-data"
+        elif body is not None:
+            kwargs["json"] = body
+        response = self.client.open(path, method=method, **kwargs)
+        parsed = response.get_json(silent=True)
+        # Errors the app handles itself (e.g. lock timeouts) never reach the tracker
+        return response.status_code, parsed, self.tracker.last() or _server_error(response.status_code, parsed)
+
+
+class HTTPClient:
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+
+    def request(self, method: str, path: str, body: Any = None, files: Optional[Dict[str, Tuple[str, bytes]]] = None) -> Tuple[int, Any, Optional[str]]:
+        headers = {}
+        payload = None
+        if files:
+            boundary = uuid.uuid4().hex
+            chunks = []
+            for field, (filename, content) in files.items():
+                chunks.append(
+                    f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+                    f"Content-Type: text/csv\r\n\r\n".encode("utf-8") + content + b"\r\n"
+                )
+            chunks.append(f"--{boundary}--\r\n".encode("utf-8"))
+            payload = b"".join(chunks)
+            headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+        elif body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.conn.close()
+            return 0, None, f"{type(e).__name__}: {e}"
+        try:
+            parsed = json.loads(data) if data else None
+        except ValueError:
+            parsed = None
+        error = None
+        if response.status >= 500:
+            error = _server_error(response.status, parsed) or data.decode("utf-8", "replace")[:200]
+        return response.status, parsed, error
+
+
+def _server_error(status: int, parsed: Any) -> Optional[str]:
+    # The app reports database errors as JSON {"error": message}
+    if status >= 500 and isinstance(parsed, dict) and parsed.get("error"):
+        return str(parsed["error"])
+    return None
+
+
+class ExceptionTracker:
+    # Records the exception raised while handling the current thread's request
+    def __init__(self):
+        self.local = threading.local()
+
+    def reset(self) -> None:
+        self.local.error = None
+
+    def record(self, sender, exception, **extra) -> None:
+        self.local.error = f"{type(exception).__name__}: {exception}"
+
+    def last(self) -> Optional[str]:
+        return getattr(self.local, "error", None)
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.lock_errors: Dict[str, int] = defaultdict(int)
+        self.samples: Dict[str, str] = {}
+
+    def record(self, endpoint: str, elapsed: float, status: int, error: Optional[str]) -> None:
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            if status == 0 or status >= 400 or error:
+                self.errors[endpoint] += 1
+                if error:
+                    self.samples.setdefault(endpoint, error)
+                    if any(m in error for m in LOCK_MESSAGES):
+                        self.lock_errors[endpoint] += 1
+
+
+class Worker(threading.Thread):
+    def __init__(self, client, stats: Stats, mix: List[Tuple[str, int]], deadline: float, rows: int, seed: int, id_pool: List[int]):
+        super().__init__(daemon=True)
+        self.client = client
+        self.stats = stats
+        self.ops = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.deadline = deadline
+        self.rows = rows
+        self.rng = random.Random(seed)
+        self.id_pool = id_pool
+
+    def call(self, endpoint: str, method: str, path: str, **kwargs) -> Tuple[int, Any]:
+        start = time.perf_counter()
+        status, body, error = self.client.request(method, path, **kwargs)
+        self.stats.record(endpoint, time.perf_counter() - start, status, error)
+        return status, body
+
+    def remember_ids(self, body: Any) -> None:
+        if isinstance(body, dict) and body.get("transactions"):
+            ids = [t["id"] for t in body["transactions"][-200:] if t.get("id")]
+            if ids:
+                self.id_pool[:] = ids
+
+    def run(self) -> None:
+        while time.time() < self.deadline:
+            op = self.rng.choices(self.ops, self.weights)[0]
+            getattr(self, f"op_{op}")()
+
+    def op_import(self) -> None:
+        statement = generate_statement(self.rows, self.rng)
+        status, body = self.call(
+            "POST /upload/preview", "POST", "/upload/preview",
+            files={"file": (f"loadtest-{uuid.uuid4().hex[:8]}.csv", statement)},
+        )
+        if status != 200 or not body:
+            return
+        file_ids = body["file_ids"]
+        status, body = self.call(
+            "POST /upload/commit", "POST", "/upload/commit",
+            body={"file_ids": file_ids, "mapping": (body.get("preview") or {}).get("suggested_mapping")},
+        )
+        if status == 200:
+            self.remember_ids(body)
+        self.call("POST /upload/cleanup", "POST", "/upload/cleanup", body={"file_ids": file_ids})
+
+    def op_list(self) -> None:
+        status, body = self.call("GET /transactions", "GET", "/transactions")
+        if status == 200:
+            self.remember_ids(body)
+
+    def op_edit(self) -> None:
+        if not self.id_pool:
+            return self.op_list()
+        txn_id = self.rng.choice(self.id_pool)
+        category = self.rng.choice(["food", "shopping", "transport", ""])
+        self.call("PATCH /transactions/<id>", "PATCH", f"/transactions/{txn_id}", body={"category": category})
+
+    def op_search(self) -> None:
+        query = urlencode({"q": self.rng.choice(SEARCH_TERMS), "limit": 50})
+        self.call("GET /transactions/search", "GET", f"/transactions/search?{query}")
+
+    def op_categories(self) -> None:
+        name = f"loadtest-{uuid.uuid4().hex[:8]}"
+        status, body = self.call("POST /categories", "POST", "/categories", body={"name": name, "keywords": "loadtest"})
+        self.call("GET /categories", "GET", "/categories")
+        if status == 200 and body and body.get("category", {}).get("id"):
+            self.call("DELETE /categories/<id>", "DELETE", f"/categories/{body['category']['id']}")
+
+
+def parse_mix(text: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not hasattr(Worker, f"op_{name}"):
+            raise SystemExit(f"unknown scenario '{name}'")
+        mix.append((name, int(weight or 1)))
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest rank; round() would send .5 to the even neighbour
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def report(stats: Stats, elapsed: float) -> None:
+    total = sum(len(v) for v in stats.latencies.values())
+    print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+    print(f"{'endpoint':<28} {'count':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'locked':>7}")
+    for endpoint in sorted(stats.latencies):
+        values = sorted(stats.latencies[endpoint])
+        print(
+            f"{endpoint:<28} {len(values):>7} {len(values) / elapsed:>7.1f} "
+            f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 95) * 1000:>8.1f} {percentile(values, 99) * 1000:>8.1f} "
+            f"{stats.errors[endpoint]:>7} {stats.lock_errors[endpoint]:>7}"
+        )
+    errors = sum(stats.errors.values())
+    locked = sum(stats.lock_errors.values())
+    print(f"\nerror rate {errors / total * 100 if total else 0:.2f}%, SQLite lock errors {locked}")
+    for endpoint, sample in sorted(stats.samples.items()):
+        print(f"  {endpoint}: {sample}")
+
+
+def make_client_factory(args, tracker: ExceptionTracker, workdir: str):
+    if args.url:
+        return lambda: HTTPClient(args.url)
+
+    # Isolate the in-process app's SQLite database and uploads from real data
+    os.chdir(workdir)
+    print(f"in-process mode, data directory {workdir}")
+    from flask import got_request_exception
+    import app as budget_app
+
+    got_request_exception.connect(tracker.record, budget_app.app, weak=False)
+    return lambda: InProcessClient(budget_app.app, tracker)
+
+
+def run(args, workdir: str) -> None:
+    mix = parse_mix(args.mix)
+    tracker = ExceptionTracker()
+    new_client = make_client_factory(args, tracker, workdir)
+    id_pool: List[int] = []
+
+    seeder = Worker(new_client(), Stats(), mix, 0, args.rows_per_statement, args.seed, id_pool)
+    for _ in range(args.seed_statements):
+        seeder.op_import()
+
+    stats = Stats()
+    deadline = time.time() + args.duration
+    workers = [
+        Worker(new_client(), stats, mix, deadline, args.rows_per_statement, args.seed + i + 1, id_pool)
+        for i in range(args.workers)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    report(stats, time.perf_counter() - start)
+
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted scenarios, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--rows-per-statement", type=int, default=200)
+    parser.add_argument("--seed-statements", type=int, default=5, help="statements imported before the run starts")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    # The in-process app's data lives only as long as the run
+    with tempfile.TemporaryDirectory(prefix="budget-loadtest-", ignore_cleanup_errors=True) as workdir:
+        try:
+            run(args, workdir)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
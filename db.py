@@ -1,11 +1,26 @@
 import json
 import os
+import re
 import sqlite3
+import threading
+import uuid
+from collections import defaultdict
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from analysis.anomalies import MIN_MONTHS, MIN_TRANSACTIONS, RunningStats, anomaly_score
+from analysis.merchants import normalize_merchant
+from models import Transaction
+from writer import WriteQueue
 
 DB_PATH = os.path.join("data", "budget.db")
 JSON_PATH = os.path.join("data", "transactions.json")
+MERCHANT_BACKFILL_BATCH = 5000
+UPDATE_BATCH = 10000
+BUSY_TIMEOUT = 30  # seconds a connection waits on another process's lock
+
+_writer: Optional[WriteQueue] = None
+_writer_lock = threading.Lock()
 
 
 def _ensure_data_dir() -> None:
@@ -14,13 +29,40 @@ def _ensure_data_dir() -> None:
 
 def get_conn() -> sqlite3.Connection:
     _ensure_data_dir()
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def _connect_writer() -> sqlite3.Connection:
+    _ensure_data_dir()
+    # Autocommit mode: the WriteQueue issues BEGIN/COMMIT itself
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def get_writer() -> WriteQueue:
+    global _writer
+    with _writer_lock:
+        # A forked worker inherits the parent's queue object but not its thread;
+        # a writer that stopped (e.g. couldn't open the database) is retried
+        if _writer is None or _writer.pid != os.getpid() or not _writer.thread.is_alive():
+            _writer = WriteQueue(_connect_writer)
+        return _writer
+
+
+def run_write(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    # All writes go through the single writer; fn receives the writer connection
+    # and must not commit - the queue commits once for each group of jobs.
+    return get_writer().submit(fn, *args, **kwargs)
+
+
 def init_db() -> None:
     with get_conn() as conn:
+        # WAL lets readers keep their own connections while the writer commits
+        conn.execute("PRAGMA journal_mode = WAL")
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS transactions (
@@ -43,6 +85,40 @@ def init_db() -> None:
         if "bank" not in cols:
             conn.execute("ALTER TABLE transactions ADD COLUMN bank TEXT")
 
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS merchants (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        if "merchant_id" not in cols:
+            conn.execute("ALTER TABLE transactions ADD COLUMN merchant_id INTEGER REFERENCES merchants(id)")
+        # Set when a category rule (rather than the user) assigned the stored category
+        if "category_rule_id" not in cols:
+            conn.execute("ALTER TABLE transactions ADD COLUMN category_rule_id INTEGER")
+        # Category the row is counted under in spending_stats: the stored category
+        # or, failing that, the automatic one when the row was imported
+        if "stats_category" not in cols:
+            conn.execute("ALTER TABLE transactions ADD COLUMN stats_category TEXT")
+        # Where the stored category came from: 'user' (manual add or edit),
+        # 'import', 'bulk' or 'rule'. Rule backfills leave 'user' rows alone.
+        if "category_source" not in cols:
+            conn.execute("ALTER TABLE transactions ADD COLUMN category_source TEXT")
+            # Parsers never assign categories, so a stored category outside
+            # rules and the legacy JSON import was chosen by the user
+            conn.execute(
+                """
+                UPDATE transactions SET category_source = CASE
+                    WHEN category_rule_id IS NOT NULL THEN 'rule'
+                    WHEN source = 'legacy-json' THEN 'import'
+                    ELSE 'user' END
+                WHERE category IS NOT NULL
+                """
+            )
+
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS category_rules (
@@ -53,6 +129,427 @@ def init_db() -> None:
             )
             """
         )
+        _init_fts(conn)
+        _init_spending_stats(conn)
+    backfill_merchant_ids()
+    # Built after the backfill so a first migration doesn't maintain it row by row
+    with get_conn() as conn:
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transactions_merchant ON transactions(merchant_id, date)"
+        )
+
+
+def _init_fts(conn: sqlite3.Connection) -> None:
+    # External-content FTS5 index over transactions.description, kept in sync by triggers
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_fts'"
+    ).fetchone()
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+            description,
+            content='transactions',
+            content_rowid='id',
+            prefix='2 3'
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+            INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description) VALUES ('delete', old.id, old.description);
+            INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+        END
+        """
+    )
+    if not exists:
+        # Index rows stored before the FTS table existed
+        conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+
+def _init_spending_stats(conn: sqlite3.Connection) -> None:
+    # Per category / merchant spending, maintained as rows come and go:
+    # monthly totals, plus running moments over those totals and over single charges
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS spending_months (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            month TEXT NOT NULL,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (scope, key, month)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS spending_stats (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            months INTEGER NOT NULL,
+            month_mean REAL NOT NULL,
+            month_m2 REAL NOT NULL,
+            txns INTEGER NOT NULL,
+            txn_mean REAL NOT NULL,
+            txn_m2 REAL NOT NULL,
+            PRIMARY KEY (scope, key)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS spending_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            month TEXT NOT NULL,
+            transaction_id INTEGER,
+            amount REAL NOT NULL,
+            expected REAL NOT NULL,
+            zscore REAL NOT NULL,
+            dismissed INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+    # At most one open month alert per category/merchant and month
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_spending_alerts_month
+        ON spending_alerts(scope, key, month) WHERE kind = 'month'
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_spending_alerts_transaction ON spending_alerts(transaction_id)"
+    )
+
+
+def _backfill_merchant_batch(conn: sqlite3.Connection, last_id: int, batch_size: int, cache: Dict[str, int]) -> Tuple[int, int]:
+    # Walk the primary key so each batch starts where the last one ended;
+    # the unary + keeps the planner off the merchant_id index
+    rows = conn.execute(
+        """
+        SELECT id, description FROM transactions
+        WHERE id > ? AND +merchant_id IS NULL
+        ORDER BY id LIMIT ?
+        """,
+        (last_id, batch_size),
+    ).fetchall()
+    if not rows:
+        return 0, last_id
+    conn.executemany(
+        "UPDATE transactions SET merchant_id = ? WHERE id = ?",
+        [(get_merchant_id(conn, row["description"], cache), row["id"]) for row in rows],
+    )
+    return len(rows), rows[-1]["id"]
+
+
+def backfill_merchant_ids(batch_size: int = MERCHANT_BACKFILL_BATCH) -> int:
+    # Assign merchant ids to rows stored before the merchants table existed,
+    # one short write job per batch so large tables never hold a long write lock.
+    updated = 0
+    last_id = 0
+    cache: Dict[str, int] = {}
+    while True:
+        count, last_id = run_write(_backfill_merchant_batch, last_id, batch_size, cache)
+        if not count:
+            break
+        updated += count
+    return updated
+
+
+def get_merchant_id(conn: sqlite3.Connection, description: str, cache: Optional[Dict[str, int]] = None) -> int:
+    name = normalize_merchant(description)
+    if cache is not None and name in cache:
+        return cache[name]
+    row = conn.execute("SELECT id FROM merchants WHERE name = ?", (name,)).fetchone()
+    if row:
+        merchant_id = row[0]
+    else:
+        cur = conn.execute(
+            "INSERT INTO merchants (name, created_at) VALUES (?, ?)",
+            (name, datetime.utcnow().isoformat()),
+        )
+        merchant_id = cur.lastrowid
+    if cache is not None:
+        cache[name] = merchant_id
+    return merchant_id
+
+
+Categorizer = Callable[[str], str]
+
+
+def _month_alert(conn: sqlite3.Connection, scope: str, key: str, month: str, total: float, history: RunningStats, now: str) -> Optional[int]:
+    # history is every other month for this key; flag this month when it spikes above them
+    z = anomaly_score(history, total, MIN_MONTHS)
+    if z is None:
+        conn.execute(
+            "DELETE FROM spending_alerts WHERE kind = 'month' AND scope = ? AND key = ? AND month = ?",
+            (scope, key, month),
+        )
+        return None
+    conn.execute(
+        """
+        INSERT INTO spending_alerts (kind, scope, key, month, amount, expected, zscore, created_at, updated_at)
+        VALUES ('month', ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (scope, key, month) WHERE kind = 'month' DO UPDATE SET
+            amount = excluded.amount, expected = excluded.expected,
+            zscore = excluded.zscore, updated_at = excluded.updated_at
+        """,
+        (scope, key, month, total, history.mean, z, now, now),
+    )
+    # lastrowid isn't reliable when the upsert took the UPDATE branch
+    return conn.execute(
+        "SELECT id FROM spending_alerts WHERE kind = 'month' AND scope = ? AND key = ? AND month = ?",
+        (scope, key, month),
+    ).fetchone()[0]
+
+
+class _SpendingTracker:
+    # Applies one write job's inserted/removed rows to spending_months and
+    # spending_stats, touching each key and month once however many rows moved,
+    # and flags new charges and months that jump well above their history.
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.stats: Dict[Tuple[str, str], Tuple[RunningStats, RunningStats]] = {}
+        self.months: Dict[Tuple[str, str, str], List[float]] = defaultdict(lambda: [0.0, 0])
+        self.flagged: List[Tuple[str, str, str, Optional[int], float, float, float]] = []
+
+    def _load(self, scope: str, key: str) -> Tuple[RunningStats, RunningStats]:
+        entry = self.stats.get((scope, key))
+        if entry is None:
+            row = self.conn.execute(
+                """
+                SELECT months, month_mean, month_m2, txns, txn_mean, txn_m2
+                FROM spending_stats WHERE scope = ? AND key = ?
+                """,
+                (scope, key),
+            ).fetchone()
+            entry = (RunningStats(*row[:3]), RunningStats(*row[3:])) if row else (RunningStats(), RunningStats())
+            self.stats[(scope, key)] = entry
+        return entry
+
+    @staticmethod
+    def _keys(merchant_id: Optional[int], category: Optional[str]) -> List[Tuple[str, str]]:
+        keys = [("category", category)] if category else []
+        if merchant_id is not None:
+            keys.append(("merchant", str(merchant_id)))
+        return keys
+
+    def add(
+        self,
+        txn_id: Optional[int],
+        date: str,
+        amount: float,
+        merchant_id: Optional[int],
+        category: Optional[str],
+        flag: bool = True,
+    ) -> None:
+        # Only expenses that have a stats category are counted
+        if amount >= 0 or not category:
+            return
+        spent = -amount
+        month = date[:7]
+        for scope, key in self._keys(merchant_id, category):
+            _, txns = self._load(scope, key)
+            z = anomaly_score(txns, spent, MIN_TRANSACTIONS) if flag else None
+            if z is not None:
+                self.flagged.append((scope, key, month, txn_id, spent, txns.mean, z))
+            txns.add(spent)
+            delta = self.months[(scope, key, month)]
+            delta[0] += spent
+            delta[1] += 1
+
+    def remove(self, date: str, amount: float, merchant_id: Optional[int], category: Optional[str]) -> None:
+        if amount >= 0 or not category:
+            return
+        spent = -amount
+        for scope, key in self._keys(merchant_id, category):
+            self._load(scope, key)[1].remove(spent)
+            delta = self.months[(scope, key, date[:7])]
+            delta[0] -= spent
+            delta[1] -= 1
+
+    def flush(self) -> List[int]:
+        # Returns the ids of the alerts raised or updated by this job
+        conn = self.conn
+        now = datetime.utcnow().isoformat()
+        alert_ids = []
+        touched = []
+        # Swap each touched month's old total for its new one in the month moments...
+        for (scope, key, month), (total_delta, count_delta) in self.months.items():
+            months, _ = self._load(scope, key)
+            row = conn.execute(
+                "SELECT total, count FROM spending_months WHERE scope = ? AND key = ? AND month = ?",
+                (scope, key, month),
+            ).fetchone()
+            if row:
+                months.remove(row["total"])
+            total = (row["total"] if row else 0.0) + total_delta
+            count = (row["count"] if row else 0) + count_delta
+            if count > 0:
+                months.add(total)
+                conn.execute(
+                    "INSERT OR REPLACE INTO spending_months (scope, key, month, total, count) VALUES (?, ?, ?, ?, ?)",
+                    (scope, key, month, total, count),
+                )
+                touched.append((scope, key, month, total))
+            else:
+                conn.execute(
+                    "DELETE FROM spending_months WHERE scope = ? AND key = ? AND month = ?",
+                    (scope, key, month),
+                )
+                _month_alert(conn, scope, key, month, 0.0, RunningStats(), now)
+        # ...then judge each against the other months once all of them are current
+        for scope, key, month, total in touched:
+            alert_id = _month_alert(conn, scope, key, month, total, self.stats[(scope, key)][0].without(total), now)
+            if alert_id is not None:
+                alert_ids.append(alert_id)
+
+        for flag in self.flagged:
+            cur = conn.execute(
+                """
+                INSERT INTO spending_alerts (kind, scope, key, month, transaction_id, amount, expected, zscore, created_at, updated_at)
+                VALUES ('transaction', ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (*flag, now, now),
+            )
+            alert_ids.append(cur.lastrowid)
+        for (scope, key), (months, txns) in self.stats.items():
+            if months.n == 0 and txns.n == 0:
+                conn.execute("DELETE FROM spending_stats WHERE scope = ? AND key = ?", (scope, key))
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO spending_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (scope, key, months.n, months.mean, months.m2, txns.n, txns.mean, txns.m2),
+            )
+        self.stats.clear()
+        self.months.clear()
+        self.flagged.clear()
+        return alert_ids
+
+
+_STATS_COLUMNS = "id, date, description, amount, category, merchant_id, stats_category"
+
+
+def _stats_category(
+    category: Optional[str],
+    description: str,
+    amount: float,
+    fallback: Optional[str],
+    categorize: Optional[Categorizer],
+    cache: Dict[str, str],
+) -> Optional[str]:
+    # A stored category wins; uncategorized expenses are counted under the
+    # automatic one, or keep their current key when no categorizer is at hand
+    if category:
+        return category
+    if amount >= 0:
+        return None
+    if categorize is None:
+        return fallback
+    auto = cache.get(description)
+    if auto is None:
+        auto = cache[description] = categorize(description)
+    return auto
+
+
+def _restat_rows(conn: sqlite3.Connection, old_rows: List[sqlite3.Row], categorize: Optional[Categorizer], cache: Dict[str, str]) -> int:
+    # After a set-based category change, move just the affected rows between
+    # spending-stats keys: out of the key they were counted under, into the new one
+    tracker = _SpendingTracker(conn)
+    updates = []
+    # Keep each statement well under SQLite's bound-parameter limit
+    chunk = 500
+    for start in range(0, len(old_rows), chunk):
+        part = old_rows[start:start + chunk]
+        current = dict(conn.execute(
+            f"SELECT id, category FROM transactions WHERE id IN ({', '.join('?' * len(part))})",
+            [row["id"] for row in part],
+        ).fetchall())
+        for old in part:
+            new = _stats_category(current.get(old["id"]), old["description"], old["amount"], old["stats_category"], categorize, cache)
+            if new == old["stats_category"]:
+                continue
+            tracker.remove(old["date"], old["amount"], old["merchant_id"], old["stats_category"])
+            tracker.add(old["id"], old["date"], old["amount"], old["merchant_id"], new, flag=False)
+            updates.append((new, old["id"]))
+    conn.executemany("UPDATE transactions SET stats_category = ? WHERE id = ?", updates)
+    # A charge flagged against its old category no longer applies
+    conn.executemany(
+        "DELETE FROM spending_alerts WHERE transaction_id = ? AND scope = 'category'",
+        [(txn_id,) for _, txn_id in updates],
+    )
+    tracker.flush()
+    return len(updates)
+
+
+def _restat_range(
+    conn: sqlite3.Connection,
+    where: str,
+    params: List[Any],
+    low: int,
+    high: int,
+    categorize: Categorizer,
+    cache: Dict[str, str],
+) -> int:
+    rows = conn.execute(
+        f"SELECT {_STATS_COLUMNS} FROM transactions WHERE id BETWEEN ? AND ? AND amount < 0 AND ({where})",
+        [low, high, *params],
+    ).fetchall()
+    return _restat_rows(conn, rows, categorize, cache) if rows else 0
+
+
+def refresh_spending_stats(
+    categorize: Categorizer,
+    keywords: Optional[List[str]] = None,
+    category: Optional[str] = None,
+    batch_size: int = UPDATE_BATCH,
+) -> int:
+    # Re-derive the automatic stats category of the uncategorized expenses a
+    # rule change can move: those matching its old or new keywords, or counted
+    # under its name. With neither, only rows never counted are picked up (rows
+    # stored before spending stats existed, or imported without a categorizer).
+    clauses = []
+    params: List[Any] = []
+    keywords = [k.strip().lower() for k in keywords or [] if k.strip()]
+    if keywords:
+        match, keyword_params = _keyword_clause(keywords)
+        clauses.append(match)
+        params.extend(keyword_params)
+    if category:
+        clauses.append("stats_category = ?")
+        params.append(category.strip().lower())
+    where = f"category IS NULL AND ({' OR '.join(clauses)})" if clauses else "stats_category IS NULL"
+
+    with get_conn() as conn:
+        low, high = conn.execute("SELECT MIN(id), MAX(id) FROM transactions").fetchone()
+    if low is None:
+        return 0
+    changed = 0
+    cache: Dict[str, str] = {}
+    while low <= high:
+        changed += run_write(_restat_range, where, params, low, low + batch_size - 1, categorize, cache)
+        low += batch_size
+    return changed
 
 
 def migrate_json_if_present() -> None:
@@ -63,67 +560,488 @@ def migrate_json_if_present() -> None:
             data = json.load(f)
         if not isinstance(data, list) or not data:
             return
-        add_transactions(data, source="legacy-json")
+        add_transactions([Transaction.from_dict(t) for t in data], source="legacy-json")
     except Exception:
         return
 
 
-def list_transactions() -> List[Dict[str, Any]]:
+def list_transactions() -> List[Transaction]:
     with get_conn() as conn:
-        rows = conn.execute(
-            "SELECT id, date, description, amount, category FROM transactions ORDER BY date"
+        cur = conn.cursor()
+        cur.row_factory = Transaction.from_row
+        return cur.execute(
+            "SELECT id, date, description, amount, category, merchant_id FROM transactions ORDER BY date"
         ).fetchall()
-    return [dict(row) for row in rows]
 
 
-def delete_transaction(txn_id: int) -> bool:
+def _effective_category(prefix: str = "") -> str:
+    # The category ExpenseAnalyzer shows for a row: the stored one, "income" for
+    # credits, otherwise the automatic category kept in stats_category
+    return (
+        f"COALESCE({prefix}category, CASE WHEN {prefix}amount >= 0 THEN 'income' "
+        f"ELSE {prefix}stats_category END)"
+    )
+
+
+_FTS_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def _fts_query(text: str) -> str:
+    # Turn user input into a safe FTS5 query: "quoted phrases" stay phrases,
+    # bare words are quoted literally and keep a trailing * as a prefix match.
+    parts = []
+    for phrase, word in _FTS_TERM.findall(text or ""):
+        if phrase.strip():
+            parts.append('"' + phrase.strip().replace('"', '""') + '"')
+        elif word:
+            prefix = word.endswith("*")
+            word = word.rstrip("*")
+            if not word:
+                continue
+            parts.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    if not parts:
+        raise ValueError("search query is empty")
+    return " ".join(parts)
+
+
+def search_transactions(
+    query: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> Tuple[List[Transaction], bool]:
+    sql = """
+        SELECT t.id, t.date, t.description, t.amount, t.category, t.merchant_id
+        FROM transactions_fts f
+        JOIN transactions t ON t.id = f.rowid
+        WHERE transactions_fts MATCH ?
+    """
+    params: List[Any] = [_fts_query(query)]
+    if start_date:
+        sql += " AND t.date >= ?"
+        params.append(start_date)
+    if end_date:
+        sql += " AND t.date <= ?"
+        params.append(end_date)
+    if category:
+        sql += f" AND {_effective_category('t.')} = ?"
+        params.append(category)
+    # Fetch one extra row to report whether another page exists without a COUNT(*)
+    sql += " ORDER BY f.rank LIMIT ? OFFSET ?"
+    params.extend([limit + 1, offset])
     with get_conn() as conn:
-        cur = conn.execute("DELETE FROM transactions WHERE id = ?", (txn_id,))
-        conn.commit()
-        return cur.rowcount > 0
+        cur = conn.cursor()
+        cur.row_factory = Transaction.from_row
+        rows = cur.execute(sql, params).fetchall()
+    return rows[:limit], len(rows) > limit
 
 
-def add_transactions(transactions: List[Dict[str, Any]], source: Optional[str] = None, bank: Optional[str] = None) -> Tuple[int, int, int]:
-    if not transactions:
-        return 0, 0, 0
+def iter_transactions(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    batch_size: int = 5000,
+) -> Iterator[List[Transaction]]:
+    # Yield batches straight off one cursor so callers never hold the whole table
+    sql = "SELECT id, date, description, amount, category, merchant_id FROM transactions WHERE 1 = 1"
+    params: List[Any] = []
+    if start_date:
+        sql += " AND date >= ?"
+        params.append(start_date)
+    if end_date:
+        sql += " AND date <= ?"
+        params.append(end_date)
+    sql += " ORDER BY date, id"
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.row_factory = Transaction.from_row
+        cur.execute(sql, params)
+        while True:
+            batch = cur.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+    finally:
+        conn.close()
+
+
+def _delete_transaction(conn: sqlite3.Connection, txn_id: int) -> bool:
+    row = conn.execute(
+        "SELECT date, amount, merchant_id, stats_category FROM transactions WHERE id = ?", (txn_id,)
+    ).fetchone()
+    if row is None:
+        return False
+    conn.execute("DELETE FROM transactions WHERE id = ?", (txn_id,))
+    conn.execute("DELETE FROM spending_alerts WHERE transaction_id = ?", (txn_id,))
+    tracker = _SpendingTracker(conn)
+    tracker.remove(row["date"], row["amount"], row["merchant_id"], row["stats_category"])
+    tracker.flush()
+    return True
+
+
+def delete_transaction(txn_id: int) -> bool:
+    return run_write(_delete_transaction, txn_id)
+
+
+def _update_transaction(conn: sqlite3.Connection, txn_id: int, changes: Dict[str, Any], categorize: Optional[Categorizer]) -> bool:
+    old = conn.execute(
+        "SELECT date, description, amount, category, merchant_id, stats_category FROM transactions WHERE id = ?",
+        (txn_id,),
+    ).fetchone()
+    if old is None:
+        raise KeyError(txn_id)
+    fields = []
+    values = []
+    if "category" in changes:
+        # A manual category replaces whatever a rule assigned
+        fields.append("category = ?, category_rule_id = NULL, category_source = ?")
+        values.extend([changes["category"] or None, "user" if changes["category"] else None])
+    merchant_id = old["merchant_id"]
+    if "description" in changes:
+        merchant_id = get_merchant_id(conn, changes["description"])
+        fields.append("description = ?, merchant_id = ?")
+        values.extend([changes["description"], merchant_id])
+    if "amount" in changes:
+        fields.append("amount = ?")
+        values.append(changes["amount"])
+    if "date" in changes:
+        fields.append("date = ?")
+        values.append(changes["date"])
+    new = {key: changes.get(key, old[key]) for key in ("date", "description", "amount", "category")}
+    stats_category = old["stats_category"]
+    if new["category"]:
+        stats_category = new["category"]
+    elif categorize and ("category" in changes or "description" in changes):
+        stats_category = categorize(new["description"])
+    fields.append("stats_category = ?")
+    values.append(stats_category)
+    values.append(txn_id)
+    conn.execute(f"UPDATE transactions SET {', '.join(fields)} WHERE id = ?", values)
+
+    conn.execute("DELETE FROM spending_alerts WHERE transaction_id = ?", (txn_id,))
+    tracker = _SpendingTracker(conn)
+    tracker.remove(old["date"], old["amount"], old["merchant_id"], old["stats_category"])
+    tracker.add(txn_id, new["date"], new["amount"], merchant_id, stats_category)
+    tracker.flush()
+    return True
+
+
+def update_transaction_fields(txn_id: int, changes: Dict[str, Any], categorize: Optional[Categorizer] = None) -> bool:
+    try:
+        return run_write(_update_transaction, txn_id, changes, categorize)
+    except KeyError:
+        return False
+
+
+def _add_transactions(
+    conn: sqlite3.Connection,
+    transactions: List[Transaction],
+    source: Optional[str],
+    bank: Optional[str],
+    categorize: Optional[Categorizer],
+) -> Tuple[int, int, int, List[int]]:
     now = datetime.utcnow().isoformat()
     added = 0
     skipped = 0
+    merchants: Dict[str, int] = {}
+    categories: Dict[str, str] = {}
+    tracker = _SpendingTracker(conn)
+    for t in transactions:
+        date = t.date
+        description = (t.description or "").strip()
+        amount = t.amount
+        category = t.category
+        if not date or not description or amount is None:
+            continue
+        amount_value = float(amount)
+        merchant_id = get_merchant_id(conn, description, merchants)
+        exists = conn.execute(
+            """
+            SELECT 1 FROM transactions
+            WHERE merchant_id = ? AND date = ? AND description = ? AND (amount = ? OR amount = ?)
+            """,
+            (merchant_id, date, description, amount_value, -amount_value),
+        ).fetchone()
+        if exists:
+            skipped += 1
+            continue
+        # Without a categorizer, uncategorized expenses wait for refresh_spending_stats
+        stats_category = _stats_category(category, description, amount_value, None, categorize, categories)
+        category_source = None
+        if category:
+            category_source = "user" if source == "manual" else "import"
+        cur = conn.execute(
+            """
+            INSERT INTO transactions (date, description, amount, category, bank, source, created_at, merchant_id, stats_category, category_source)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (date, description, amount_value, category, bank, source, now, merchant_id, stats_category, category_source),
+        )
+        tracker.add(cur.lastrowid, date, amount_value, merchant_id, stats_category)
+        added += 1
+    alert_ids = tracker.flush()
+    return len(transactions), added, skipped, alert_ids
+
+
+def add_transactions(
+    transactions: List[Transaction],
+    source: Optional[str] = None,
+    bank: Optional[str] = None,
+    categorize: Optional[Categorizer] = None,
+) -> Tuple[int, int, int, List[int]]:
+    if not transactions:
+        return 0, 0, 0, []
+    return run_write(_add_transactions, transactions, source, bank, categorize)
+
+
+def list_merchant_totals(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    query = """
+        SELECT m.id, m.name, COUNT(*) AS count,
+               SUM(CASE WHEN t.amount < 0 THEN -t.amount ELSE 0 END) AS total_spent,
+               MIN(t.date) AS first_date, MAX(t.date) AS last_date
+        FROM transactions t
+        JOIN merchants m ON m.id = t.merchant_id
+        GROUP BY t.merchant_id
+        ORDER BY total_spent DESC
+    """
+    params: Tuple[Any, ...] = ()
+    if limit:
+        query += " LIMIT ?"
+        params = (limit,)
     with get_conn() as conn:
-        for t in transactions:
-            date = t.get("date")
-            description = (t.get("description") or "").strip()
-            amount = t.get("amount")
-            category = t.get("category")
-            if not date or not description or amount is None:
-                continue
-            amount_value = float(amount)
-            exists = conn.execute(
-                """
-                SELECT 1 FROM transactions
-                WHERE date = ? AND description = ? AND (amount = ? OR amount = ?)
-                """,
-                (date, description, amount_value, -amount_value),
-            ).fetchone()
-            if exists:
-                skipped += 1
-                continue
-            conn.execute(
-                """
-                INSERT INTO transactions (date, description, amount, category, bank, source, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (date, description, amount_value, category, bank, source, now),
-            )
-            added += 1
-        conn.commit()
-    return len(transactions), added, skipped
+        rows = conn.execute(query, params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def list_spending_alerts(
+    since: Optional[str] = None,
+    include_dismissed: bool = False,
+    limit: Optional[int] = None,
+    ids: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    if ids is not None and not ids:
+        return []
+    query = """
+        SELECT a.id, a.kind, a.scope, a.key, a.month, a.transaction_id, a.amount, a.expected,
+               a.zscore, a.dismissed, a.created_at, a.updated_at,
+               CASE WHEN a.scope = 'merchant' THEN m.name ELSE a.key END AS name,
+               t.date, t.description
+        FROM spending_alerts a
+        LEFT JOIN merchants m ON a.scope = 'merchant' AND m.id = CAST(a.key AS INTEGER)
+        LEFT JOIN transactions t ON t.id = a.transaction_id
+        WHERE 1 = 1
+    """
+    params: List[Any] = []
+    if since:
+        query += " AND a.updated_at >= ?"
+        params.append(since)
+    if not include_dismissed:
+        query += " AND a.dismissed = 0"
+    order = " ORDER BY a.updated_at DESC, a.zscore DESC"
+    with get_conn() as conn:
+        if ids is None:
+            if limit:
+                order += " LIMIT ?"
+                params.append(limit)
+            return [dict(row) for row in conn.execute(query + order, params).fetchall()]
+        rows: List[sqlite3.Row] = []
+        # A first import of a long history can raise more alerts than SQLite
+        # allows bound parameters, so look them up in chunks
+        chunk = 500
+        for start in range(0, len(ids), chunk):
+            part = ids[start:start + chunk]
+            rows.extend(conn.execute(
+                query + f" AND a.id IN ({', '.join('?' * len(part))})", [*params, *part]
+            ).fetchall())
+    rows.sort(key=lambda row: (row["updated_at"], row["zscore"]), reverse=True)
+    return [dict(row) for row in rows[:limit or None]]
+
+
+def _dismiss_spending_alert(conn: sqlite3.Connection, alert_id: int) -> bool:
+    cur = conn.execute("UPDATE spending_alerts SET dismissed = 1 WHERE id = ?", (alert_id,))
+    return cur.rowcount > 0
+
+
+def dismiss_spending_alert(alert_id: int) -> bool:
+    return run_write(_dismiss_spending_alert, alert_id)
+
+
+def _clear_transactions(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM transactions")
+    conn.execute("DELETE FROM spending_months")
+    conn.execute("DELETE FROM spending_stats")
+    conn.execute("DELETE FROM spending_alerts")
 
 
 def clear_transactions() -> None:
+    run_write(_clear_transactions)
+
+
+def _update_range(
+    conn: sqlite3.Connection,
+    assignments: str,
+    set_params: List[Any],
+    where: str,
+    where_params: List[Any],
+    low: int,
+    high: int,
+    categorize: Optional[Categorizer],
+    cache: Dict[str, str],
+) -> int:
+    match = f"id BETWEEN ? AND ? AND ({where})"
+    rows = conn.execute(
+        f"SELECT {_STATS_COLUMNS} FROM transactions WHERE {match}", [low, high, *where_params]
+    ).fetchall()
+    if not rows:
+        return 0
+    conn.execute(f"UPDATE transactions SET {assignments} WHERE {match}", [*set_params, low, high, *where_params])
+    _restat_rows(conn, rows, categorize, cache)
+    return len(rows)
+
+
+def _batched_update(
+    assignments: str,
+    set_params: List[Any],
+    where: str,
+    where_params: List[Any],
+    batch_size: int = UPDATE_BATCH,
+    categorize: Optional[Categorizer] = None,
+) -> int:
+    # One set-based UPDATE per primary-key range, each its own write job, so a
+    # large backfill never holds the writer for the whole table. Spending stats
+    # for the updated rows are adjusted in the same job.
     with get_conn() as conn:
-        conn.execute("DELETE FROM transactions")
-        conn.commit()
+        low, high = conn.execute("SELECT MIN(id), MAX(id) FROM transactions").fetchone()
+    if low is None:
+        return 0
+    updated = 0
+    cache: Dict[str, str] = {}
+    while low <= high:
+        updated += run_write(
+            _update_range, assignments, set_params, where, where_params, low, low + batch_size - 1, categorize, cache
+        )
+        low += batch_size
+    return updated
+
+
+def _update_category_by_ids(conn: sqlite3.Connection, category: Optional[str], ids: List[int], categorize: Optional[Categorizer]) -> int:
+    updated = 0
+    cache: Dict[str, str] = {}
+    # Keep each statement well under SQLite's bound-parameter limit
+    chunk = 500
+    for start in range(0, len(ids), chunk):
+        part = ids[start:start + chunk]
+        placeholders = ', '.join('?' * len(part))
+        rows = conn.execute(f"SELECT {_STATS_COLUMNS} FROM transactions WHERE id IN ({placeholders})", part).fetchall()
+        conn.execute(
+            f"UPDATE transactions SET category = ?, category_rule_id = NULL, category_source = ? WHERE id IN ({placeholders})",
+            [category, "bulk" if category else None, *part],
+        )
+        updated += len(rows)
+        _restat_rows(conn, rows, categorize, cache)
+    return updated
+
+
+def _create_match_table(conn: sqlite3.Connection, table: str, fts_query: str) -> None:
+    conn.execute(f"CREATE TEMP TABLE {table} (id INTEGER PRIMARY KEY)")
+    conn.execute(
+        f"INSERT INTO {table} (id) SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?",
+        (fts_query,),
+    )
+
+
+def _drop_table(conn: sqlite3.Connection, table: str) -> None:
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def bulk_update_category(
+    category: Optional[str],
+    ids: Optional[List[int]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    batch_size: int = UPDATE_BATCH,
+    categorize: Optional[Categorizer] = None,
+) -> int:
+    category = category or None
+    if ids:
+        # A string would otherwise be iterated digit by digit
+        if isinstance(ids, (str, bytes)) or not all(isinstance(i, int) for i in ids):
+            raise TypeError("ids must be a list of integers")
+        return run_write(_update_category_by_ids, category, list(ids), categorize)
+
+    clauses = []
+    params: List[Any] = []
+    filters = filters or {}
+    if not isinstance(filters, dict):
+        raise TypeError("filter must be a mapping")
+    if filters.get("start_date"):
+        clauses.append("date >= ?")
+        params.append(filters["start_date"])
+    if filters.get("end_date"):
+        clauses.append("date <= ?")
+        params.append(filters["end_date"])
+    if filters.get("category"):
+        clauses.append(f"{_effective_category()} = ?")
+        params.append(filters["category"])
+    match_table = None
+    if filters.get("q"):
+        # Resolve the full-text match once rather than once per id range. Temp
+        # tables live on the writer connection, so the name is unique per call.
+        match_table = f"bulk_match_{uuid.uuid4().hex}"
+        run_write(_create_match_table, match_table, _fts_query(filters["q"]))
+        # Unary + keeps the scan on the id range and probes the match table per row
+        clauses.append(f"+id IN (SELECT id FROM temp.{match_table})")
+    if not clauses:
+        raise ValueError("filter must include at least one of start_date, end_date, category, q")
+    try:
+        return _batched_update(
+            "category = ?, category_rule_id = NULL, category_source = ?",
+            [category, "bulk" if category else None],
+            " AND ".join(clauses),
+            params,
+            batch_size,
+            categorize,
+        )
+    finally:
+        if match_table:
+            run_write(_drop_table, match_table)
+
+
+def _keyword_clause(keywords: List[str]) -> Tuple[str, List[str]]:
+    # Mirrors ExpenseAnalyzer._categorize_description: '&' becomes a space, then substring match
+    clause = " OR ".join(["instr(replace(lower(description), '&', ' '), ?) > 0"] * len(keywords))
+    return clause, keywords
+
+
+def apply_category_rule(
+    rule_id: int,
+    overwrite: bool = False,
+    batch_size: int = UPDATE_BATCH,
+    categorize: Optional[Categorizer] = None,
+) -> int:
+    with get_conn() as conn:
+        rule = conn.execute(
+            "SELECT id, name, keywords FROM category_rules WHERE id = ?", (rule_id,)
+        ).fetchone()
+    if rule is None:
+        raise KeyError(rule_id)
+    category = rule["name"].strip().lower()
+    keywords = [k.strip().lower() for k in rule["keywords"].split(",") if k.strip()]
+
+    # Undo this rule's earlier assignments so changed keywords are re-evaluated
+    _batched_update("category = NULL, category_rule_id = NULL, category_source = NULL", [], "category_rule_id = ?", [rule_id], batch_size, categorize)
+    if not keywords:
+        return 0
+
+    match, params = _keyword_clause(keywords)
+    where = f"amount < 0 AND ({match})"
+    if not overwrite:
+        # Imported, bulk and rule categories follow the rule; user-chosen ones stay
+        where += " AND category_source IS NOT 'user'"
+    return _batched_update(
+        "category = ?, category_rule_id = ?, category_source = 'rule'", [category, rule_id], where, params, batch_size, categorize
+    )
 
 
 def list_category_rules() -> List[Dict[str, Any]]:
@@ -134,20 +1052,41 @@ def list_category_rules() -> List[Dict[str, Any]]:
     return [dict(row) for row in rows]
 
 
+def _keywords_str(keywords: List[str]) -> str:
+    return ",".join([k.strip().lower() for k in keywords if k.strip()])
+
+
+def _insert_category_rule(conn: sqlite3.Connection, name: str, keywords_str: str) -> int:
+    cur = conn.execute(
+        "INSERT INTO category_rules (name, keywords, created_at) VALUES (?, ?, ?)",
+        (name, keywords_str, datetime.utcnow().isoformat()),
+    )
+    return cur.lastrowid
+
+
 def add_category_rule(name: str, keywords: List[str]) -> Dict[str, Any]:
-    now = datetime.utcnow().isoformat()
-    keywords_str = ",".join([k.strip().lower() for k in keywords if k.strip()])
-    with get_conn() as conn:
-        conn.execute(
-            "INSERT INTO category_rules (name, keywords, created_at) VALUES (?, ?, ?)",
-            (name.strip(), keywords_str, now),
-        )
-        conn.commit()
-    return {"name": name.strip(), "keywords": keywords_str}
+    keywords_str = _keywords_str(keywords)
+    rule_id = run_write(_insert_category_rule, name.strip(), keywords_str)
+    return {"id": rule_id, "name": name.strip(), "keywords": keywords_str}
 
 
-def delete_category_rule(rule_id: int) -> bool:
-    with get_conn() as conn:
-        cur = conn.execute("DELETE FROM category_rules WHERE id = ?", (rule_id,))
-        conn.commit()
-        return cur.rowcount > 0
+def _update_category_rule(conn: sqlite3.Connection, rule_id: int, keywords_str: str) -> bool:
+    cur = conn.execute("UPDATE category_rules SET keywords = ? WHERE id = ?", (keywords_str, rule_id))
+    return cur.rowcount > 0
+
+
+def update_category_rule(rule_id: int, keywords: List[str]) -> bool:
+    return run_write(_update_category_rule, rule_id, _keywords_str(keywords))
+
+
+def _delete_category_rule(conn: sqlite3.Connection, rule_id: int) -> bool:
+    cur = conn.execute("DELETE FROM category_rules WHERE id = ?", (rule_id,))
+    return cur.rowcount > 0
+
+
+def delete_category_rule(rule_id: int, categorize: Optional[Categorizer] = None) -> bool:
+    deleted = run_write(_delete_category_rule, rule_id)
+    if deleted:
+        # Rows this rule categorized fall back to automatic categorization
+        _batched_update("category = NULL, category_rule_id = NULL, category_source = NULL", [], "category_rule_id = ?", [rule_id], categorize=categorize)
+    return deleted
@@ -0,0 +1,151 @@
+import csv
+import io
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from models import Transaction
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; CSV export works without it
+    pa = None
+    pa_ipc = None
+    pq = None
+
+TRANSACTION_COLUMNS = ["id", "date", "description", "amount", "category"]
+ANALYSIS_COLUMNS = ["month", "category", "total"]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+Batch = List[Transaction]
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def filter_batches(batches: Iterable[Batch], categorize: Callable[[Batch], Batch], category: Optional[str] = None) -> Iterator[Batch]:
+    # Categorize as rows stream past so auto-categorized rows can be filtered too
+    for batch in batches:
+        batch = categorize(batch)
+        if category:
+            batch = [t for t in batch if t.category == category]
+        if batch:
+            yield batch
+
+
+def iter_csv(batches: Iterable[Batch]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TRANSACTION_COLUMNS)
+    for batch in batches:
+        writer.writerows((t.id, t.date, t.description, t.amount, t.category) for t in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_analysis_csv(batches: Iterable[Batch]) -> Iterator[str]:
+    # Month x category totals; memory grows with months, not with rows
+    totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for batch in batches:
+        for t in batch:
+            if t.amount < 0:
+                totals[t.date[:7]][t.category] += abs(t.amount)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ANALYSIS_COLUMNS)
+    for month in sorted(totals):
+        for category, total in sorted(totals[month].items()):
+            writer.writerow((month, category, round(total, 2)))
+    yield buffer.getvalue()
+
+
+class _ChunkSink:
+    # Minimal writable file object that hands written bytes back to a generator
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _record_batch(batch: Batch):
+    return pa.record_batch(
+        [
+            pa.array([t.id for t in batch], type=pa.int64()),
+            pa.array([t.date for t in batch], type=pa.string()),
+            pa.array([t.description for t in batch], type=pa.string()),
+            pa.array([t.amount for t in batch], type=pa.float64()),
+            pa.array([t.category for t in batch], type=pa.string()),
+        ],
+        names=TRANSACTION_COLUMNS,
+    )
+
+
+def _transaction_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("date", pa.string()),
+        ("description", pa.string()),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+    ])
+
+
+def iter_parquet(batches: Iterable[Batch]) -> Iterator[bytes]:
+    if pq is None:
+        raise RuntimeError("pyarrow is required for Parquet export")
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, _transaction_schema())
+    try:
+        # Each batch becomes its own row group, flushed to the client as it is written
+        for batch in batches:
+            writer.write_batch(_record_batch(batch))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_arrow(batches: Iterable[Batch]) -> Iterator[bytes]:
+    if pa_ipc is None:
+        raise RuntimeError("pyarrow is required for Arrow export")
+    sink = _ChunkSink()
+    writer = pa_ipc.new_stream(sink, _transaction_schema())
+    try:
+        for batch in batches:
+            writer.write_batch(_record_batch(batch))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
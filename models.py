@@ -0,0 +1,50 @@
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class Transaction:
+    # Slotted record used from parser to DB to analyzer; dicts are only
+    # produced at the JSON boundary via to_dict().
+    __slots__ = ("id", "date", "description", "amount", "category", "merchant_id")
+
+    def __init__(self, date: str, description: str, amount: Optional[float], category: Optional[str] = None, id: Optional[int] = None, merchant_id: Optional[int] = None):
+        self.id = id
+        self.merchant_id = merchant_id
+        self.date = date
+        # Descriptions and categories repeat heavily, so share one string object per value
+        self.description = sys.intern(description) if description else description
+        self.amount = amount
+        self.category = sys.intern(category) if category else category
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Transaction":
+        amount = data.get("amount")
+        return cls(
+            date=data.get("date"),
+            description=(data.get("description") or "").strip(),
+            amount=float(amount) if amount is not None else None,
+            category=data.get("category") or None,
+            id=data.get("id"),
+        )
+
+    @classmethod
+    def from_row(cls, cursor, row) -> "Transaction":
+        # sqlite3 row_factory for "SELECT id, date, description, amount, category, merchant_id"
+        return cls(row[1], row[2], row[3], row[4], row[0], row[5])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "date": self.date,
+            "description": self.description,
+            "amount": self.amount,
+            "category": self.category,
+            "merchant_id": self.merchant_id,
+        }
+
+    def __repr__(self) -> str:
+        return f"Transaction({self.date!r}, {self.description!r}, {self.amount!r}, category={self.category!r}, id={self.id!r})"
+
+
+def to_dicts(transactions: Iterable[Transaction]) -> List[Dict[str, Any]]:
+    return [t.to_dict() for t in transactions]
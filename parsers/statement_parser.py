@@ -1,7 +1,107 @@
+import multiprocessing
+import os
 import pandas as pd
 import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from functools import lru_cache
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple
+from models import Transaction
+
+# PDFs shorter than this are parsed in-process; a pool costs more than it saves
+PDF_PARALLEL_MIN_PAGES = 8
+PDF_CHUNKS_PER_WORKER = 4
+PDF_WORKERS = os.cpu_count() or 1
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_pid: Optional[int] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    # One pool per process, started on first use and reused by later imports
+    global _pdf_pool, _pdf_pool_pid
+    with _pdf_pool_lock:
+        if _pdf_pool is None or _pdf_pool_pid != os.getpid():
+            # spawn rather than fork: the server process has live threads (the DB writer)
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            _pdf_pool_pid = os.getpid()
+        return _pdf_pool
+
+
+def _reset_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _bounded_map(pool: ProcessPoolExecutor, fn: Callable, calls: List[tuple], limit: int) -> Iterator[Any]:
+    # pool.map with at most `limit` calls in flight, so one statement never
+    # occupies more of the shared pool than it asked for. Results come back in
+    # call order.
+    pending: deque = deque()
+    remaining = iter(calls)
+    try:
+        for args in remaining:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= limit:
+                break
+        while pending:
+            result = pending.popleft().result()
+            args = next(remaining, None)
+            if args is not None:
+                pending.append(pool.submit(fn, *args))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+@lru_cache(maxsize=8)
+def _combined_pattern(patterns: Tuple[str, ...]) -> "re.Pattern":
+    # One alternation over every line pattern, so each page is scanned once
+    return re.compile("|".join(f"(?:{p})" for p in patterns))
+
+
+def _match_lines(text: str, patterns: Tuple[str, ...]) -> List[Tuple[str, str, str]]:
+    combined = _combined_pattern(patterns)
+    matches = []
+    # Line by line: the patterns' \s+ would otherwise run across line breaks
+    for line in text.splitlines():
+        for m in combined.finditer(line):
+            groups = m.groups()
+            # Each pattern contributes (date, description, amount); take the one that matched
+            for i in range(0, len(groups), 3):
+                if groups[i] is not None:
+                    matches.append(groups[i:i + 3])
+                    break
+    return matches
+
+
+def _extract_pdf_pages(filepath: str, first: int, last: int, patterns: Tuple[str, ...]) -> List[Tuple[str, str, str]]:
+    # Runs in a worker process: open the PDF, read pages [first, last) and
+    # return only the matched fields rather than the page text.
+    import pdfplumber
+
+    matches = []
+    with pdfplumber.open(filepath) as pdf:
+        for page in pdf.pages[first:last]:
+            matches.extend(_match_lines(page.extract_text() or "", patterns))
+            page.flush_cache()
+    return matches
+
+
+def _pdf_page_count(filepath: str) -> int:
+    import pdfplumber
+
+    with pdfplumber.open(filepath) as pdf:
+        return len(pdf.pages)
+
 
 class StatementParser:
     def __init__(self):
@@ -27,12 +127,72 @@ class StatementParser:
             "return", "adjustment"
         ]
     
-    def parse_statement(self, filepath: str, mapping: Optional[Dict[str, str]] = None, statement_type: str = "bank") -> List[Dict[str, Any]]:
+    def parse_statement(self, filepath: str, mapping: Optional[Dict[str, str]] = None, statement_type: str = "bank") -> List[Transaction]:
         path_lower = filepath.lower()
         if path_lower.endswith(('.csv', '.xlsx', '.xls')):
             return self._parse_spreadsheet(filepath, mapping=mapping, statement_type=statement_type)
+        elif path_lower.endswith('.pdf'):
+            return self._parse_pdf(filepath, statement_type=statement_type)
+        else:
+            raise ValueError("Unsupported file format (CSV/Excel/PDF only)")
+
+    def preview_pdf(self, filepath: str, max_rows: int = 5) -> Dict[str, Any]:
+        matches = _extract_pdf_pages(filepath, 0, 2, tuple(self.transaction_patterns))
+        columns = ["Date", "Description", "Amount"]
+        return {
+            "columns": columns,
+            "sample_rows": [dict(zip(columns, m)) for m in matches[:max_rows]],
+            "suggested_mapping": self._map_columns(columns)
+        }
+
+    def _parse_pdf(self, filepath: str, statement_type: str = "bank", max_workers: Optional[int] = None) -> List[Transaction]:
+        patterns = tuple(self.transaction_patterns)
+        pages = _pdf_page_count(filepath)
+        workers = min(max_workers or PDF_WORKERS, pages)
+
+        if pages < PDF_PARALLEL_MIN_PAGES or workers <= 1:
+            transactions = self._pdf_matches_to_transactions([_extract_pdf_pages(filepath, 0, pages, patterns)])
         else:
-            raise ValueError("Unsupported file format (CSV/Excel only)")
+            step = max(1, -(-pages // (workers * PDF_CHUNKS_PER_WORKER)))
+            starts = list(range(0, pages, step))
+            pool = _get_pdf_pool()
+            try:
+                # Chunks come back in page order as they finish, so rows are
+                # converted while later pages are still being extracted; at most
+                # `workers` chunks run at once
+                chunks = _bounded_map(
+                    pool,
+                    _extract_pdf_pages,
+                    [(filepath, start, start + step, patterns) for start in starts],
+                    workers,
+                )
+                transactions = self._pdf_matches_to_transactions(chunks)
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool for the next statement
+                _reset_pdf_pool(pool)
+                raise
+
+        return self._pdf_expenses(transactions, statement_type)
+
+    def _pdf_matches_to_transactions(self, chunks) -> List[Transaction]:
+        transactions = []
+        for matches in chunks:
+            for date_str, description, amount_str in matches:
+                try:
+                    transactions.append(Transaction(
+                        self._parse_date(date_str),
+                        description.strip() or "Unknown",
+                        self._parse_amount(amount_str)
+                    ))
+                except ValueError:
+                    continue
+        return transactions
+
+    def _pdf_expenses(self, transactions: List[Transaction], statement_type: str) -> List[Transaction]:
+        # Amounts in PDF statements are often unsigned, so normalize signs first
+        # and then drop credits, matching what the spreadsheet path keeps.
+        cleaned = self._clean_transactions(transactions, statement_type=statement_type)
+        return [t for t in cleaned if t.amount < 0]
 
     def preview_spreadsheet(self, filepath: str, max_rows: int = 5) -> Dict[str, Any]:
         df = self._read_spreadsheet(filepath)
@@ -52,7 +212,7 @@ class StatementParser:
             return pd.read_csv(filepath, dtype=str, sep=None, engine="python", on_bad_lines="skip")
         return pd.read_excel(filepath, dtype=str)
 
-    def _parse_spreadsheet(self, filepath: str, mapping: Optional[Dict[str, str]] = None, statement_type: str = "bank") -> List[Dict[str, Any]]:
+    def _parse_spreadsheet(self, filepath: str, mapping: Optional[Dict[str, str]] = None, statement_type: str = "bank") -> List[Transaction]:
         df = self._read_spreadsheet(filepath)
         
         df = df.fillna("")
@@ -121,12 +281,7 @@ class StatementParser:
                 if is_credit or amount > 0:
                     continue
 
-                transactions.append({
-                    'date': date,
-                    'description': description or "Unknown",
-                    'amount': amount,
-                    'category': None
-                })
+                transactions.append(Transaction(date, description or "Unknown", amount))
             except (ValueError, IndexError):
                 continue
 
@@ -166,46 +321,46 @@ class StatementParser:
         value = float(amount_str)
         return -value if negative else value
     
-    def _clean_transactions(self, transactions: List[Dict[str, Any]], statement_type: str = "bank") -> List[Dict[str, Any]]:
+    def _clean_transactions(self, transactions: List[Transaction], statement_type: str = "bank") -> List[Transaction]:
         transactions = self._normalize_signs(transactions, statement_type=statement_type)
         cleaned = []
         seen = set()
         
         for transaction in transactions:
-            if not transaction.get('description'):
+            if not transaction.description:
                 continue
-            key = (transaction['date'], transaction['description'], transaction['amount'])
-            if key not in seen and abs(transaction['amount']) > 0.01:
+            key = (transaction.date, transaction.description, transaction.amount)
+            if key not in seen and abs(transaction.amount) > 0.01:
                 cleaned.append(transaction)
                 seen.add(key)
         
-        return sorted(cleaned, key=lambda x: x['date'])
+        return sorted(cleaned, key=lambda x: x.date)
 
-    def _normalize_signs(self, transactions: List[Dict[str, Any]], statement_type: str = "bank") -> List[Dict[str, Any]]:
+    def _normalize_signs(self, transactions: List[Transaction], statement_type: str = "bank") -> List[Transaction]:
         if not transactions:
             return transactions
 
         if statement_type == "credit":
             for t in transactions:
-                description = (t.get('description') or "").lower()
+                description = (t.description or "").lower()
                 if any(k in description for k in self.credit_keywords):
-                    t['amount'] = abs(t.get('amount', 0))
+                    t.amount = abs(t.amount or 0)
                 else:
-                    t['amount'] = -abs(t.get('amount', 0))
+                    t.amount = -abs(t.amount or 0)
             return transactions
 
-        has_negative = any(t.get('amount', 0) < 0 for t in transactions)
+        has_negative = any((t.amount or 0) < 0 for t in transactions)
         if has_negative:
             return transactions
 
         # Heuristic: if no negatives exist, assume this is a credit card statement
         # and treat most amounts as expenses (negative), except payments/refunds.
         for t in transactions:
-            description = (t.get('description') or "").lower()
+            description = (t.description or "").lower()
             if any(k in description for k in self.credit_keywords):
-                t['amount'] = abs(t.get('amount', 0))
+                t.amount = abs(t.amount or 0)
             else:
-                t['amount'] = -abs(t.get('amount', 0))
+                t.amount = -abs(t.amount or 0)
 
         return transactions
 
@@ -0,0 +1,162 @@
+import gzip
+import hashlib
+import os
+import tarfile
+import uuid
+import zipfile
+import zlib
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 1024 * 1024
+STATEMENT_EXTENSIONS = ('.csv', '.xlsx', '.xls', '.pdf')
+TAR_EXTENSIONS = ('.tar.gz', '.tgz')
+ARCHIVE_EXTENSIONS = ('.zip', '.gz', '.tgz')
+# Only a damaged or unsupported archive; failures writing the expanded files
+# (disk full, permissions) propagate and fail the upload
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError, gzip.BadGzipFile, NotImplementedError)
+
+
+class UploadLimitError(ValueError):
+    pass
+
+
+def is_statement(name: str) -> bool:
+    return name.lower().endswith(STATEMENT_EXTENSIONS)
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _archive_members(path: str, name: str, max_entries: int) -> Iterator[Tuple[str, Optional[IO[bytes]]]]:
+    # Yield (member name, readable stream) one at a time, with no stream for
+    # directories and other non-files; nothing is extracted to disk here and
+    # each stream is only valid until the next member
+    lower = name.lower()
+    if lower.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            infos = archive.infolist()
+            # The central directory says up front how many members there are
+            if len(infos) > max_entries:
+                raise UploadLimitError("upload contains too many files")
+            for info in infos:
+                if info.is_dir():
+                    yield info.filename, None
+                    continue
+                if info.flag_bits & 0x1:
+                    raise zipfile.BadZipFile(f"{info.filename} is encrypted")
+                with archive.open(info) as member:
+                    yield info.filename, member
+    elif lower.endswith(TAR_EXTENSIONS):
+        # Stream mode reads the gzip once, front to back
+        with tarfile.open(path, mode='r|gz') as archive:
+            for info in archive:
+                yield info.name, archive.extractfile(info) if info.isfile() else None
+    else:
+        with gzip.open(path, 'rb') as member:
+            yield name[:-len('.gz')], member
+
+
+class UploadBatch:
+    # Stores the files of one upload request in chunks, hashing as it writes.
+    # Archives are expanded member by member into individual statement files;
+    # the expanded size and file count across the whole request are capped, and
+    # byte-identical statements are kept once.
+
+    def __init__(self, folder: str, max_bytes: int, max_entries: int):
+        self.folder = folder
+        self.remaining_bytes = max_bytes
+        self.remaining_entries = max_entries
+        self.files: List[Dict[str, Any]] = []
+        self.errors: List[str] = []
+        self.hashes: Dict[str, str] = {}
+
+    def add(self, source: IO[bytes], filename: str) -> None:
+        if not is_archive(filename):
+            self._take_entry()
+            self._add_file(source, filename)
+            return
+        # The archive itself only lives until it has been expanded
+        archive = self._write(source, filename, counted=False)
+        try:
+            self._expand(archive['path'], filename)
+        finally:
+            os.remove(archive['path'])
+
+    def discard(self) -> None:
+        for saved in self.files:
+            try:
+                os.remove(saved['path'])
+            except OSError:
+                pass
+        self.files = []
+
+    @property
+    def file_ids(self) -> List[str]:
+        return [saved['file_id'] for saved in self.files]
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        return [{k: v for k, v in saved.items() if k != 'path'} for saved in self.files]
+
+    def _expand(self, path: str, archive_name: str) -> None:
+        members = _archive_members(path, archive_name, self.remaining_entries)
+        try:
+            for member_name, stream in members:
+                # Every member counts, skipped ones included, so junk entries
+                # can't be used to get around the limit
+                self._take_entry()
+                name = os.path.basename(member_name)
+                label = f"{archive_name}/{member_name}"
+                if stream is None or not name or name.startswith('.') or '__MACOSX' in member_name:
+                    continue
+                if not is_statement(name):
+                    self.errors.append(f"{label}: unsupported file format (CSV/Excel/PDF only)")
+                    continue
+                self._add_file(stream, name, label)
+        except ARCHIVE_ERRORS as e:
+            self.errors.append(f"{archive_name}: could not read archive ({e})")
+        finally:
+            members.close()
+
+    def _add_file(self, source: IO[bytes], filename: str, label: Optional[str] = None) -> None:
+        saved = self._write(source, filename)
+        saved['name'] = label or filename
+        duplicate = self.hashes.get(saved['sha256'])
+        if duplicate:
+            os.remove(saved['path'])
+            self.errors.append(f"{saved['name']}: skipped, same content as {duplicate}")
+            return
+        self.hashes[saved['sha256']] = saved['name']
+        self.files.append(saved)
+
+    def _take_entry(self) -> None:
+        self.remaining_entries -= 1
+        if self.remaining_entries < 0:
+            raise UploadLimitError("upload contains too many files")
+
+    def _write(self, source: IO[bytes], filename: str, counted: bool = True) -> Dict[str, Any]:
+        file_id = f"{uuid.uuid4().hex}_{secure_filename(filename)}"
+        path = os.path.join(self.folder, file_id)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(path, 'wb') as out:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if counted:
+                        # Counts bytes actually produced, so archive headers can't understate sizes
+                        self.remaining_bytes -= len(chunk)
+                        if self.remaining_bytes < 0:
+                            raise UploadLimitError("upload is too large once decompressed")
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return {'file_id': file_id, 'name': filename, 'path': path, 'size': size, 'sha256': digest.hexdigest()}
@@ -0,0 +1,116 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, List, Optional, Tuple
+
+Job = Tuple[Callable[..., Any], tuple, dict, Future]
+# How often a waiting caller checks that the writer thread is still alive
+LIVENESS_INTERVAL = 1.0
+
+
+class WriteQueue:
+    # Owns the only writing SQLite connection in this process. Request threads
+    # submit jobs (callables taking the connection as their first argument);
+    # a single thread runs whatever has queued up inside one transaction, with
+    # a savepoint per job, and commits once for the whole group.
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_batch: int = 64, window: float = 0.002):
+        self.connect = connect
+        self.max_batch = max_batch
+        self.window = window
+        self.pid = os.getpid()
+        self.error: Optional[BaseException] = None
+        self.jobs: "queue.Queue[Job]" = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if threading.current_thread() is self.thread:
+            # A job calling another write helper just joins the current transaction
+            return fn(self.conn, *args, **kwargs)
+        self._check_alive()
+        future: Future = Future()
+        self.jobs.put((fn, args, kwargs, future))
+        while True:
+            try:
+                return future.result(timeout=LIVENESS_INTERVAL)
+            except FutureTimeout:
+                # A job queued just as the writer died would never be picked up
+                if not future.done():
+                    self._check_alive()
+
+    def _check_alive(self) -> None:
+        if self.error is not None:
+            raise RuntimeError(f"database writer stopped: {self.error}") from self.error
+        if not self.thread.is_alive():
+            raise RuntimeError("database writer stopped")
+
+    def _run(self) -> None:
+        try:
+            self.conn = self.connect()
+            while True:
+                self._run_group(self._collect())
+        except BaseException as e:
+            # The writer can't go on (e.g. the database can't be opened); fail
+            # everything queued instead of leaving callers waiting forever
+            self.error = e
+            while True:
+                try:
+                    _, _, _, future = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                future.set_exception(e)
+
+    def _run_group(self, group: List[Job]) -> None:
+        try:
+            self._commit_group(group)
+        except BaseException as e:
+            # The group as a whole failed (BEGIN/COMMIT or a savepoint); undo
+            # everything and report the error to every waiting caller.
+            if self.conn.in_transaction:
+                try:
+                    self.conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            for _, _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _collect(self) -> List[Job]:
+        group = [self.jobs.get()]
+        # Give concurrent requests a moment to land in the same commit
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                group.append(self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return group
+
+    def _commit_group(self, group: List[Job]) -> None:
+        conn = self.conn
+        outcomes: List[Tuple[Future, Any, Optional[BaseException]]] = []
+        conn.execute("BEGIN IMMEDIATE")
+        for fn, args, kwargs, future in group:
+            conn.execute("SAVEPOINT job")
+            try:
+                result = fn(conn, *args, **kwargs)
+            except Exception as e:
+                # Only this job's changes are undone; the rest of the group still commits
+                conn.execute("ROLLBACK TO job")
+                conn.execute("RELEASE job")
+                outcomes.append((future, None, e))
+            else:
+                conn.execute("RELEASE job")
+                outcomes.append((future, result, None))
+        conn.execute("COMMIT")
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
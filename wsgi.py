@@ -0,0 +1,27 @@
+import argparse
+import os
+
+from app import app, init_app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the budget app under a production WSGI server")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5000)))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("THREADS", 8)))
+    args = parser.parse_args()
+    init_app()
+
+    try:
+        from waitress import serve
+    except ImportError:
+        from werkzeug.serving import run_simple
+        print("waitress is not installed; falling back to werkzeug's threaded server")
+        run_simple(args.host, args.port, app, threaded=True)
+        return
+    # One process, many threads: every write funnels through db's single writer
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()